@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""End-to-end latency benchmark for rft actions.
+
+Runs RFT.switch_session, switch_window, kill_window and load_tmuxinator
+in-process against:
+
+- a real tmux server on a private ``-L`` socket, populated with the requested
+  number of sessions and windows, with one client attached through script(1)
+  so switch-client has something to switch;
+- a fake i3 serving a synthetic tree over the i3 IPC protocol on a private
+  Unix socket (exported as I3SOCK), one i3 window per tmux session;
+- a scripted rofi that picks a known entry (or cancels) instead of showing a
+  menu.
+
+Each run uses a fresh RFT, like a CLI invocation, and reports the wall time of
+the action split into phases (exclusive of nested phases), along with the
+number of tmux commands and i3 IPC messages it took. Interpreter startup and
+imports aren't included, see bench/startup.py for those.
+
+Usage::
+
+    python bench/e2e.py [--sessions 10,100,500,2000] [--windows-per-session 2]
+                        [--repeat N] [--launcher rofi|stream] [--json FILE]
+                        [SCENARIO ...]
+
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ['switch_session', 'switch_window', 'kill_window', 'load_tmuxinator']
+SOCKET_NAME = 'rft-bench-{}'.format(os.getpid())
+VICTIM = 'rft-victim'
+I3_MAGIC = b'i3-ipc'
+I3_HEADER = struct.Struct('=6sII')
+I3_TYPES = {0: 'COMMAND', 1: 'GET_WORKSPACES', 2: 'SUBSCRIBE', 3: 'GET_OUTPUTS',
+            4: 'GET_TREE', 7: 'GET_VERSION'}
+WORKSPACES = 10
+# RFT methods timed as phases, some nest (eg the cache is loaded while
+# listing tmuxinator projects), time is always accounted to the innermost.
+PHASES = [
+    ('_load_config', 'config'),
+    ('_load_cache', 'cache'),
+    ('_refresh_snapshot', 'snapshot'),
+    ('_get_tmuxinator_projects', 'tmuxinator'),
+    ('_resolve_visibility', 'wm'),
+    ('_annotate', 'annotate'),
+    ('_focus_tmux_window', 'wm'),
+    ('_switch_to', 'switch'),
+    ('_write_cache', 'write_cache'),
+]
+
+
+class Recorder(object):
+    """Collects phase timings and tmux round-trips of the current run."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases = Counter()
+        self.tmux_calls = 0
+        self._stack = []
+
+    def wrap(self, fn, phase):
+        """Return fn timed as phase, when called from the main thread.
+
+        :fn: function to wrap
+        :phase: phase name
+
+        """
+        recorder = self
+
+        def timed(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                return fn(*args, **kwargs)
+            frame = [time.perf_counter(), 0.0]
+            recorder._stack.append(frame)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder._stack.pop()
+                elapsed = time.perf_counter() - frame[0]
+                recorder.phases[phase] += elapsed - frame[1]
+                if recorder._stack:
+                    recorder._stack[-1][1] += elapsed
+
+        return timed
+
+    def count_tmux(self, fn):
+        """Return fn counting each call as a tmux round-trip.
+
+        :fn: libtmux.Server.cmd
+
+        """
+        recorder = self
+
+        def cmd(*args, **kwargs):
+            recorder.tmux_calls += 1
+            return fn(*args, **kwargs)
+
+        return cmd
+
+
+class ScriptedRofi(object):
+    """Stands in for rofi.Rofi and StreamingRofi: picks the first entry
+    matching the current pick, or cancels when there is none."""
+
+    def __init__(self, recorder) -> None:
+        self._recorder = recorder
+        self.pick = None
+        self.errors = []
+
+    def select(self, prompt, options, select=None, **kwargs) -> tuple:
+        def choose():
+            for i, entry in enumerate(options):
+                if self.pick is not None and self.pick(entry):
+                    return i, 0
+            return -1, -1
+
+        return self._recorder.wrap(choose, 'menu')()
+
+    def select_many(self, prompt, options, select=None, **kwargs) -> tuple:
+        index, key = self.select(prompt, options, select)
+        return ([index] if key == 0 else []), key
+
+    def error(self, message, **kwargs) -> None:
+        self.errors.append(message)
+
+
+class I3Handler(socketserver.BaseRequestHandler):
+    """Answers i3 IPC requests from the server's canned replies."""
+
+    def handle(self) -> None:
+        sock = self.request
+        while True:
+            header = _recv_exactly(sock, I3_HEADER.size)
+            if not header:
+                return
+            magic, length, msg_type = I3_HEADER.unpack(header)
+            if magic != I3_MAGIC:
+                return
+            payload = _recv_exactly(sock, length) if length else b''
+            reply = self.server.reply(msg_type, payload)
+            sock.sendall(I3_HEADER.pack(I3_MAGIC, len(reply), msg_type) + reply)
+
+
+class FakeI3(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a synthetic i3 tree with one terminal per tmux session."""
+
+    daemon_threads = True
+
+    def __init__(self, path, session_names) -> None:
+        super(FakeI3, self).__init__(path, I3Handler)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._tree = json.dumps(_i3_tree(session_names)).encode('utf-8')
+        self._workspaces = json.dumps([
+            {'num': n, 'name': str(n), 'visible': n == 1, 'focused': n == 1,
+             'urgent': False, 'output': 'bench-0', 'rect': _rect()}
+            for n in range(1, WORKSPACES + 1)
+        ]).encode('utf-8')
+
+    def reply(self, msg_type, payload) -> bytes:
+        with self._lock:
+            self.calls[I3_TYPES.get(msg_type, str(msg_type))] += 1
+        if msg_type == 4:
+            return self._tree
+        if msg_type == 1:
+            return self._workspaces
+        if msg_type == 7:
+            return b'{"major":4,"minor":23,"patch":0,"human_readable":"4.23 (bench)"}'
+        if msg_type == 0:
+            return b'[{"success":true}]'
+        return b'{"success":true}'
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+
+def _recv_exactly(sock, size) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _rect() -> dict:
+    return {'x': 0, 'y': 0, 'width': 1920, 'height': 1080}
+
+
+def _i3_tree(session_names) -> dict:
+    """Build an i3 tree spreading one terminal per session over WORKSPACES
+    workspaces, every other workspace tabbed.
+
+    :session_names: tmux session names, used as the terminal titles
+
+    """
+    ids = iter(range(1, 10 ** 9))
+    workspaces = []
+    for n in range(1, WORKSPACES + 1):
+        layout = 'tabbed' if n % 2 == 0 else 'splith'
+        workspaces.append({'id': next(ids), 'type': 'workspace', 'name': str(n),
+                           'num': n, 'layout': layout, 'rect': _rect(),
+                           'nodes': [], 'floating_nodes': [], 'focus': []})
+    for i, name in enumerate(session_names):
+        ws = workspaces[i % WORKSPACES]
+        con_id = next(ids)
+        ws['nodes'].append({'id': con_id, 'type': 'con', 'name': name,
+                            'window': 0x1000000 + con_id, 'layout': 'splith',
+                            'rect': _rect(), 'nodes': [], 'floating_nodes': [],
+                            'focus': []})
+        ws['focus'].insert(0, con_id)
+    content = {'id': next(ids), 'type': 'con', 'name': 'content', 'layout': 'splith',
+               'rect': _rect(), 'nodes': workspaces, 'floating_nodes': [],
+               'focus': [w['id'] for w in workspaces]}
+    output = {'id': next(ids), 'type': 'output', 'name': 'bench-0', 'layout': 'output',
+              'rect': _rect(), 'nodes': [content], 'floating_nodes': [],
+              'focus': [content['id']]}
+    return {'id': next(ids), 'type': 'root', 'name': 'root', 'layout': 'splith',
+            'rect': _rect(), 'nodes': [output], 'floating_nodes': [],
+            'focus': [output['id']]}
+
+
+def _tmux(*args) -> str:
+    return subprocess.run(['tmux', '-L', SOCKET_NAME] + list(args), check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+def populate(tmpdir, sessions, windows) -> tuple:
+    """Start the private tmux server with sessions x windows, attach a client
+    to the first session and return the session names along with the client
+    process.
+
+    :tmpdir: scratch directory
+    :sessions: number of sessions
+    :windows: number of windows per session
+
+    """
+    names = ['bench-{:05d}'.format(i) for i in range(sessions)]
+    conf = os.path.join(tmpdir, 'tmux.conf')
+    with open(conf, 'w') as f:
+        # a cheap long-lived process per pane instead of a shell
+        f.write("set -g default-command 'exec cat'\n")
+    script = os.path.join(tmpdir, 'populate.tmux')
+    with open(script, 'w') as f:
+        for name in names[1:]:
+            f.write('new-session -d -s {} -x 80 -y 24\n'.format(name))
+        for name in names:
+            for _ in range(windows - 1):
+                f.write('new-window -d -t {}:\n'.format(name))
+    _tmux('-f', conf, 'new-session', '-d', '-s', names[0], '-x', '80', '-y', '24')
+    _tmux('source-file', script)
+    # a real client, kept attached as long as its stdin stays open
+    client = subprocess.Popen(
+        ['script', '-qfc', 'tmux -L {} attach -t {}'.format(SOCKET_NAME, names[0]),
+         '/dev/null'],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while not _tmux('list-clients', '-F', '#{client_name}').strip():
+        if time.time() > deadline or client.poll() is not None:
+            raise RuntimeError('could not attach a tmux client')
+        time.sleep(0.05)
+    return names, client
+
+
+def tmuxinator_projects(tmpdir, count) -> None:
+    """Write count tmuxinator project files and point TMUXINATOR_CONFIG at them.
+
+    :tmpdir: scratch directory
+    :count: number of projects
+
+    """
+    confdir = os.path.join(tmpdir, 'tmuxinator')
+    os.makedirs(confdir, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(confdir, 'project-{:05d}.yml'.format(i)), 'w') as f:
+            f.write('name: project-{:05d}\nroot: ~/\nwindows:\n  - main:\n'.format(i))
+    os.environ['TMUXINATOR_CONFIG'] = confdir
+
+
+def run_scenario(rft_module, scenario, names, rofi, recorder, i3, n) -> dict:
+    """Run one scenario once on a fresh RFT and return its measurements.
+
+    :rft_module: the rft.rft module
+    :scenario: one of SCENARIOS
+    :names: tmux session names
+    :rofi: ScriptedRofi
+    :recorder: Recorder
+    :i3: FakeI3
+    :n: run number, used to alternate targets
+
+    """
+    import libtmux
+
+    target = names[-1] if n % 2 == 0 else names[0]
+    if scenario == 'switch_session':
+        rofi.pick = lambda e: e.split()[0] == target
+    elif scenario == 'switch_window':
+        rofi.pick = lambda e: e.startswith(target + ':')
+    elif scenario == 'kill_window':
+        _tmux('new-window', '-d', '-t', names[-1] + ':', '-n', VICTIM)
+        rofi.pick = lambda e: e.endswith(':' + VICTIM)
+    else:
+        rofi.pick = None
+
+    r = rft_module.RFT()
+    server = libtmux.Server(socket_name=SOCKET_NAME)
+    server.cmd = recorder.count_tmux(server.cmd)
+    r.__dict__['_libts'] = server
+    r.__dict__['_rofi'] = rofi
+    recorder.reset()
+    i3.reset()
+    start = time.perf_counter()
+    getattr(r, scenario)()
+    total = time.perf_counter() - start
+    phases = dict(recorder.phases)
+    phases['other'] = max(total - sum(phases.values()), 0.0)
+    return {
+        'total_ms': total * 1000,
+        'phases_ms': {k: v * 1000 for k, v in phases.items()},
+        'tmux_calls': recorder.tmux_calls,
+        'i3_calls': dict(i3.calls),
+    }
+
+
+def _median(values):
+    return round(statistics.median(values), 3)
+
+
+def summarize(runs) -> dict:
+    phases = sorted({p for r in runs for p in r['phases_ms']})
+    i3_types = sorted({t for r in runs for t in r['i3_calls']})
+    return {
+        'total_ms': _median([r['total_ms'] for r in runs]),
+        'phases_ms': {p: _median([r['phases_ms'].get(p, 0.0) for r in runs])
+                      for p in phases},
+        'tmux_calls': max(r['tmux_calls'] for r in runs),
+        'i3_calls': {t: max(r['i3_calls'].get(t, 0) for r in runs) for t in i3_types},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='rft end-to-end benchmark')
+    parser.add_argument('scenarios', nargs='*', default=SCENARIOS,
+                        help='any of {}'.format(', '.join(SCENARIOS)))
+    parser.add_argument('--sessions', default='10,100,500,2000',
+                        help='comma separated session counts')
+    parser.add_argument('--windows-per-session', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--launcher', choices=['rofi', 'stream'], default='rofi')
+    parser.add_argument('--json', dest='json_file', default=None)
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+
+    tmpdir = tempfile.mkdtemp(prefix='rft-bench-')
+    os.environ['HOME'] = tmpdir
+    os.environ['TMUX_TMPDIR'] = tmpdir
+    # keeps the menu file (see rofi_script.py) out of the real runtime dir
+    os.environ['XDG_RUNTIME_DIR'] = tmpdir
+    os.environ.pop('TMUX', None)
+    os.environ['I3SOCK'] = os.path.join(tmpdir, 'i3.sock')
+    with open(os.path.join(tmpdir, '.rft'), 'w') as f:
+        json.dump({'wm': 'i3', 'visibility': 'i3', 'launcher': args.launcher,
+                   'lookup_timeout': 5}, f)
+
+    from rft import rft as rft_module
+    from rft import launcher
+
+    recorder = Recorder()
+    for attr, phase in PHASES:
+        setattr(rft_module.RFT, attr, recorder.wrap(getattr(rft_module.RFT, attr), phase))
+    rofi = ScriptedRofi(recorder)
+    launcher.StreamingRofi.select = lambda self, *a, **kw: rofi.select(*a, **kw)
+    launcher.StreamingRofi.select_many = lambda self, *a, **kw: rofi.select_many(*a, **kw)
+
+    results = {
+        'tmux': _tmux_version(),
+        'python': sys.version.split()[0],
+        'launcher': args.launcher,
+        'windows_per_session': args.windows_per_session,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    for sessions in [int(s) for s in args.sessions.split(',')]:
+        names, client = populate(tmpdir, sessions, args.windows_per_session)
+        tmuxinator_projects(tmpdir, sessions)
+        i3 = FakeI3(os.environ['I3SOCK'], names)
+        threading.Thread(target=i3.serve_forever, daemon=True).start()
+        try:
+            for scenario in args.scenarios:
+                runs = [run_scenario(rft_module, scenario, names, rofi, recorder, i3, n)
+                        for n in range(args.repeat)]
+                res = dict(summarize(runs), scenario=scenario, sessions=sessions,
+                           windows=sessions * args.windows_per_session)
+                results['results'].append(res)
+                print('{:<16} {:>5} sessions {:>9.2f} ms  tmux {:>3}  i3 {:>3}  {}'.format(
+                    scenario, sessions, res['total_ms'], res['tmux_calls'],
+                    sum(res['i3_calls'].values()),
+                    ' '.join('{}={}'.format(p, ms) for p, ms in res['phases_ms'].items())))
+        finally:
+            i3.shutdown()
+            i3.server_close()
+            os.unlink(os.environ['I3SOCK'])
+            subprocess.run(['tmux', '-L', SOCKET_NAME, 'kill-server'],
+                           stderr=subprocess.DEVNULL)
+            client.stdin.close()
+            client.wait()
+    if rofi.errors:
+        print('rofi errors: {}'.format(rofi.errors))
+
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+
+def _tmux_version() -> str:
+    return subprocess.run(['tmux', '-V'], stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout.strip()
+
+
+if __name__ == '__main__':
+    main()
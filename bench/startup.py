@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Startup benchmark for rft subcommands.
+
+Reports, for each subcommand, the import time of the rft entry points and the
+wall time from spawning ``rft`` until it first execs rofi (or exits, for
+commands that never show a menu). rofi is replaced by a stub that records the
+time it was launched and cancels right away, so nothing is switched or killed.
+
+Usage::
+
+    python bench/startup.py [--repeat N] [--json FILE] [--no-daemon] [CMD ...]
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = ['v', 'ss', 'sw', 'ks', 'kw', 'lp']
+ROFI_STUB = '''#!/bin/sh
+python3 -c 'import time; print(time.time())' >> "{stamps}"
+exit 1
+'''
+
+
+def import_time(module) -> float:
+    """Return the cumulative import time of module in milliseconds.
+
+    :module: dotted module name
+
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        cwd=ROOT, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        universal_newlines=True)
+    for line in proc.stderr.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000.0
+    return None
+
+
+def run_once(cmd, env, stamps) -> dict:
+    """Spawn rft once and time it.
+
+    :cmd: rft subcommand
+    :env: environment to run rft with
+    :stamps: file rofi stub appends its launch time to
+
+    """
+    open(stamps, 'w').close()
+    start = time.time()
+    subprocess.run([sys.executable, '-m', 'rft.bin.main', cmd], cwd=ROOT,
+                   env=env, stdin=subprocess.DEVNULL,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    total = time.time() - start
+    with open(stamps) as f:
+        launched = [float(l) for l in f.read().split()]
+    return {
+        'first_rofi_ms': (launched[0] - start) * 1000 if launched else None,
+        'total_ms': total * 1000,
+    }
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 2) if values else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='rft startup benchmark')
+    parser.add_argument('commands', nargs='*', default=COMMANDS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', dest='json_file', default=None)
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='never forward to a running rft daemon')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='rft-bench-')
+    stamps = os.path.join(tmpdir, 'stamps')
+    stub = os.path.join(tmpdir, 'rofi')
+    with open(stub, 'w') as f:
+        f.write(ROFI_STUB.format(stamps=stamps))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+    env = dict(os.environ, PATH=tmpdir + os.pathsep + os.environ['PATH'])
+    if args.no_daemon:
+        env['RFT_SOCKET'] = os.path.join(tmpdir, 'none.sock')
+
+    results = {
+        'import_ms': {m: import_time(m) for m in ('rft.bin.main', 'rft.bin.cli')},
+        'commands': {},
+    }
+    for cmd in args.commands:
+        runs = [run_once(cmd, env, stamps) for _ in range(args.repeat)]
+        results['commands'][cmd] = {
+            'first_rofi_ms': _median(r['first_rofi_ms'] for r in runs),
+            'total_ms': _median(r['total_ms'] for r in runs),
+        }
+
+    for module, ms in results['import_ms'].items():
+        print('import {:<14} {:>8} ms'.format(module, ms))
+    print('{:<6} {:>14} {:>10}'.format('cmd', 'first rofi ms', 'total ms'))
+    for cmd, r in results['commands'].items():
+        print('{:<6} {:>14} {:>10}'.format(cmd, str(r['first_rofi_ms']), r['total_ms']))
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
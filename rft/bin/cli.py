@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import click
+import logging
+import rft.rft as rft
+import rft.version as version
+
+
+@click.group()
+@click.pass_context
+@click.option(
+    '--debug',
+    default=False,
+    is_flag=True,
+    help='Enables logging at debug level.')
+@click.option(
+    '--trace',
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help='Write timed spans of the command to this file, in Chrome '
+    'trace-event format.')
+def cli(ctx, debug, trace):
+    """RFT (rofi-tmux) switcher."""
+    logging.basicConfig(level=logging.INFO)
+    if trace:
+        from rft.trace import Tracer
+
+        tracer = Tracer(trace)
+        tracer.install()
+
+        @ctx.call_on_close
+        def write_trace():
+            tracer.uninstall()
+            tracer.write()
+
+    if ctx.obj is None:
+        ctx.obj = rft.RFT(debug=debug)
+
+
+@cli.command()
+@click.option(
+    '--query',
+    default=None,
+    help='switch to the session fuzzy matching this best, without asking')
+@click.option(
+    '--list',
+    'list_only',
+    default=False,
+    is_flag=True,
+    help='print the sessions matching --query, best first, instead of '
+    'switching')
+@click.pass_obj
+def ss(ctx, query, list_only):
+    """Switch tmux session.
+
+    :param ctx: context
+    :param query: session name query
+    :param list_only: True to print matches only
+    """
+    if not ctx.switch_session(query=query, list_only=list_only):
+        raise click.ClickException('nothing matches {}'.format(query))
+
+
+@cli.command()
+@click.option(
+    '--pattern',
+    default=None,
+    help='kill every session matching this shell-style pattern, '
+    'without asking')
+@click.pass_obj
+def ks(ctx, pattern):
+    """Kill tmux sessions.
+
+    :param ctx: context
+    :param pattern: session name pattern
+    """
+    ctx.kill_session(pattern=pattern)
+
+
+@cli.command()
+@click.option(
+    '--session_name',
+    default=None,
+    help='limit the scope to this this sesison')
+@click.option(
+    '--global_scope',
+    default=True,
+    type=bool,
+    help='true, if you want to consider all windows')
+@click.option(
+    '--query',
+    default=None,
+    help='switch to the window whose session:index:name fuzzy matches this '
+    'best, without asking')
+@click.option(
+    '--list',
+    'list_only',
+    default=False,
+    is_flag=True,
+    help='print the windows matching --query, best first, instead of '
+    'switching')
+@click.pass_obj
+def sw(ctx, session_name, global_scope, query, list_only):
+    """Switch tmux window.
+
+    :param ctx: context
+    :param session_name: tmux session name
+    :param global_scope: True to consider all windows
+    :param query: window label query
+    :param list_only: True to print matches only
+    """
+    if not ctx.switch_window(session_name=session_name, global_scope=global_scope,
+                             query=query, list_only=list_only):
+        raise click.ClickException('nothing matches {}'.format(query))
+
+
+@cli.command()
+@click.pass_obj
+def sp(ctx):
+    """Switch tmux pane.
+
+    :param ctx: context
+    """
+    ctx.switch_pane()
+
+
+@cli.command()
+@click.argument('query', required=False)
+@click.pass_obj
+def grep(ctx, query):
+    """Switch to the tmux pane that printed some text.
+
+    :param ctx: context
+    :param query: text to look for
+    """
+    ctx.grep(query=query)
+
+
+@cli.command()
+@click.option(
+    '--session_name',
+    default=None,
+    help='limit the scope to this this sesison')
+@click.option(
+    '--global_scope',
+    default=True,
+    type=bool,
+    help='true, if you want to consider all windows')
+@click.option(
+    '--pattern',
+    default=None,
+    help='kill every window whose session:index:name matches this '
+    'shell-style pattern, without asking')
+@click.pass_obj
+def kw(ctx, session_name, global_scope, pattern):
+    """Kill tmux windows.
+
+    :param ctx: context
+    :param session_name: tmux session name
+    :param global_scope: True to consider all windows
+    :param pattern: window label pattern
+    """
+    ctx.kill_window(session_name=session_name, global_scope=global_scope,
+                    pattern=pattern)
+
+
+@cli.command('rofi-script')
+@click.argument('selection', required=False)
+def rofi_script(selection):
+    """Serve rofi script mode: rofi -modi 'rft:rft rofi-script' -show rft.
+
+    :param selection: entry rofi passes back
+    """
+    from rft.rofi_script import main
+
+    main([selection] if selection else [])
+
+
+@cli.command()
+@click.argument('name', required=False)
+@click.option(
+    '--dir',
+    'directory',
+    default=None,
+    type=click.Path(file_okay=False, exists=True),
+    help='directory the session starts in')
+@click.pass_obj
+def ns(ctx, name, directory):
+    """Create a tmux session and switch to it.
+
+    :param ctx: context
+    :param name: session name
+    :param directory: starting directory
+    """
+    ctx.new_session(name=name, directory=directory)
+
+
+@cli.command()
+@click.pass_obj
+def lp(ctx):
+    """Load tmuxinator project.
+
+    :param ctx: context
+    """
+    ctx.load_tmuxinator()
+
+
+@cli.command()
+@click.pass_obj
+def save(ctx):
+    """Save tmux sessions, for restore.
+
+    :param ctx: context
+    """
+    ctx.save()
+
+
+@cli.command()
+@click.pass_obj
+def restore(ctx):
+    """Recreate saved tmux sessions.
+
+    :param ctx: context
+    """
+    ctx.restore()
+
+
+@cli.command()
+def v():
+    """Print version."""
+    print(version.__version__)
+
+
+@cli.command()
+@click.pass_context
+def daemon(ctx):
+    """Serve rft commands from a warm background process.
+
+    :param ctx: context
+    """
+    from rft.control import TmuxControlModel
+    from rft.daemon import Daemon
+
+    debug = ctx.parent.params.get('debug')
+    logger = logging.getLogger('rft.daemon')
+    model = TmuxControlModel(server=ctx.obj._libts, logger=logger)
+
+    def factory():
+        r = rft.RFT(debug=debug, tmux_model=model)
+        r.watch()
+        return r
+
+    d = Daemon(cli, factory, logger)
+    model.start()
+    try:
+        d.serve_forever()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    finally:
+        model.stop()
@@ -1,99 +1,108 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import click
-import rft.rft as rft
-import rft.version as version
+import os
+import sys
 
+# group options taking a value, which mustn't be mistaken for a subcommand.
+OPTIONS_WITH_VALUE = ('--trace',)
+# subcommands showing a menu, run by one instance at a time.
+GUARDED = ('ss', 'ks', 'sw', 'sp', 'grep', 'kw', 'lp', 'ns')
+# options making a guarded subcommand act without a menu, eg from scripts.
+HEADLESS_OPTIONS = ('--query', '--list', '--pattern')
+# seconds to wait for an instance running another command.
+GUARD_TIMEOUT = 5
 
-@click.group()
-@click.pass_context
-@click.option(
-    '--debug',
-    default=False,
-    is_flag=True,
-    help='Enables logging at debug level.')
-def main(ctx, debug):
-    """RFT (rofi-tmux) switcher."""
-    ctx.obj = rft.RFT(debug=debug)
 
+def _subcommand(argv) -> str:
+    """Return the subcommand name in argv, if any.
 
-@main.command()
-@click.pass_obj
-def ss(ctx):
-    """Switch tmux session.
+    :argv: command line arguments, sans program name
 
-    :param ctx: context
     """
-    ctx.switch_session()
+    args = iter(argv)
+    for arg in args:
+        if arg in OPTIONS_WITH_VALUE:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
 
 
-@main.command()
-@click.pass_obj
-def ks(ctx):
-    """Kill tmux session.
-
-    :param ctx: context
-    """
-    ctx.kill_session()
-
-
-@main.command()
-@click.option(
-    '--session_name',
-    default=None,
-    help='limit the scope to this this sesison')
-@click.option(
-    '--global_scope',
-    default=True,
-    type=bool,
-    help='true, if you want to consider all windows')
-@click.pass_obj
-def sw(ctx, session_name, global_scope):
-    """Switch tmux window.
-
-    :param ctx: context
-    :param session_name: tmux session name
-    :param global_scope: True to consider all windows
-    """
-    ctx.switch_window(session_name=session_name, global_scope=global_scope)
-
-
-@main.command()
-@click.option(
-    '--session_name',
-    default=None,
-    help='limit the scope to this this sesison')
-@click.option(
-    '--global_scope',
-    default=True,
-    type=bool,
-    help='true, if you want to consider all windows')
-@click.pass_obj
-def kw(ctx, session_name, global_scope):
-    """Kill tmux window.
-
-    :param ctx: context
-    :param session_name: tmux session name
-    :param global_scope: True to consider all windows
-    """
-    ctx.kill_window(session_name=session_name, global_scope=global_scope)
+def _shows_menu(argv) -> bool:
+    """Decide whether argv opens a rofi menu, which only one instance at a
+    time should.
 
+    :argv: command line arguments, sans program name
 
-@main.command()
-@click.pass_obj
-def lp(ctx):
-    """Load tmuxinator project.
-
-    :param ctx: context
     """
-    ctx.load_tmuxinator()
-
+    command = _subcommand(argv)
+    if command not in GUARDED or '--help' in argv:
+        return False
+    if any(a.split('=')[0] in HEADLESS_OPTIONS for a in argv):
+        return False
+    if command == 'ns':
+        # the session name is only asked for when it isn't given.
+        args = iter(argv[argv.index(command) + 1:])
+        for arg in args:
+            if arg == '--dir':
+                next(args, None)
+            elif not arg.startswith('-'):
+                return False
+    return True
+
+
+def _in_process(argv) -> bool:
+    """Decide whether argv has to run in this process rather than on the
+    daemon.
+
+    :argv: command line arguments, sans program name
 
-@main.command()
-def v():
-    """Print version."""
-    print(version.__version__)
+    """
+    if _subcommand(argv) in (None, 'daemon') or '--help' in argv:
+        return True
+    # traces cover this process only.
+    if any(a.split('=')[0] == '--trace' for a in argv):
+        return True
+    # attaching to a session needs our terminal.
+    return sys.stdin.isatty() and 'TMUX' not in os.environ
+
+
+def main(argv=None) -> None:
+    """rft entry point: forward to the daemon if one is running, otherwise run
+    the command in-process."""
+    argv = sys.argv[1:] if argv is None else argv
+    if _subcommand(argv) == 'rofi-script' and '--help' not in argv:
+        # called by rofi on every keystroke that matters, skip click and the
+        # daemon round-trip.
+        from rft.rofi_script import main as rofi_script
+
+        rofi_script(argv[argv.index('rofi-script') + 1:])
+        return
+    if not _in_process(argv):
+        from rft.daemon import forward
+
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+    from rft.bin.cli import cli
+
+    if not _shows_menu(argv):
+        cli(args=argv, prog_name='rft')
+        return
+    from rft.runtime import InstanceLock
+
+    lock = InstanceLock()
+    try:
+        if not lock.acquire(' '.join(argv), GUARD_TIMEOUT):
+            # the same command is already running, eg key repeat.
+            return
+    except TimeoutError as e:
+        sys.exit('rft: {}'.format(e))
+    try:
+        cli(args=argv, prog_name='rft')
+    finally:
+        lock.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import tempfile
+
+SCHEMA_VERSION = 2
+# compact the journal into the base file once it grows past this many bytes.
+COMPACT_THRESHOLD = 32 * 1024
+_DUMPS = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+class CacheStore(dict):
+    """Cache dict persisted as a base file plus an append-only journal.
+
+    Updates are appended to the journal as the leaf values that changed since
+    load, under an advisory lock, so concurrent rft processes merge their
+    updates instead of clobbering each other. Once the journal gets big it's
+    folded into the base file, which is replaced atomically.
+
+    Files: <path> holds {"version": N, "data": {...}}, <path>.journal holds
+    one [path, value] (set) or [path] (delete) JSON array per line.
+
+    """
+
+    def __init__(self, path, defaults=None, logger=None) -> None:
+        """Constructor
+
+        :path: base file path, eg ~/.rft.cache
+        :defaults: values used for top-level keys missing from the cache
+        :logger: logger to report to
+
+        """
+        super(CacheStore, self).__init__()
+        self._path = path
+        self._journal = path + '.journal'
+        self._lock_path = path + '.lock'
+        self._defaults = dict(defaults or {})
+        self.logger = logger or logging.getLogger(__name__)
+        self._baseline = {}
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        """Hold the advisory lock shared by every rft process.
+
+        :exclusive: True for writers, False for readers
+
+        """
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def load(self) -> 'CacheStore':
+        """(Re)load base file and journal."""
+        try:
+            with self._locked(exclusive=False):
+                data = self._read()
+        except OSError as e:
+            self.logger.debug('cache unavailable: {}'.format(e))
+            data = {}
+        self.clear()
+        self.update(self._defaults)
+        self.update(data)
+        self._baseline = _flatten(self)
+        return self
+
+    def _read(self) -> dict:
+        """Read the base file and replay the journal, lock must be held."""
+        data = {}
+        try:
+            with open(self._path, 'r') as f:
+                base = json.load(f)
+            if isinstance(base, dict):
+                if 'version' in base and isinstance(base.get('data'), dict):
+                    data = base['data']
+                else:
+                    # version 1: the dict itself, pretty printed.
+                    data = base
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            self.logger.warning('ignoring corrupt cache {}: {}'.format(self._path, e))
+        try:
+            with open(self._journal, 'r') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        # torn write, eg crashed mid-append.
+                        continue
+                    _apply(data, op)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def flush(self) -> None:
+        """Append whatever changed since load to the journal."""
+        current = _flatten(self)
+        # deletes go first: a leaf replaced by a dict (or the other way
+        # around) shows up as a delete of the old path plus sets of new ones.
+        ops = []
+        for k in self._baseline:
+            if k not in current:
+                op = [list(_gone(self, k))]
+                if op not in ops:
+                    ops.append(op)
+        ops += [[list(k), v] for k, v in current.items()
+                if k not in self._baseline or self._baseline[k] != v]
+        if not ops:
+            return
+        payload = ''.join(_DUMPS(op) + '\n' for op in ops).encode('utf-8')
+        with self._locked(exclusive=True):
+            fd = os.open(self._journal, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b'\n':
+                    # terminate a torn line so it doesn't swallow ours.
+                    payload = b'\n' + payload
+                os.write(fd, payload)
+                size += len(payload)
+            finally:
+                os.close(fd)
+            if size > COMPACT_THRESHOLD:
+                self._compact()
+        self._baseline = current
+        self.logger.debug('wrote cache: {} updates'.format(len(ops)))
+
+    def _compact(self) -> None:
+        """Fold the journal into the base file, lock must be held."""
+        data = self._read()
+        base = _DUMPS({'version': SCHEMA_VERSION, 'data': data})
+        dirname = os.path.dirname(self._path) or '.'
+        fd, tmp = tempfile.mkstemp(prefix='.rft.cache.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(base)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        os.truncate(self._journal, 0)
+        self.logger.debug('compacted cache journal')
+
+
+def _flatten(data, prefix=()) -> dict:
+    """Flatten nested dicts into a {key path tuple: leaf value} dict.
+
+    :data: dict to flatten
+    :prefix: key path of data itself
+
+    """
+    flat = {}
+    for k, v in data.items():
+        path = prefix + (k,)
+        if isinstance(v, dict) and v:
+            flat.update(_flatten(v, path))
+        else:
+            flat[path] = v
+    return flat
+
+
+def _gone(data, path) -> tuple:
+    """Return the shortest prefix of path missing from data, so that deleting
+    a whole subtree doesn't leave empty dicts behind.
+
+    :data: nested dicts path is missing from
+    :path: key path tuple
+
+    """
+    node = data
+    for i, k in enumerate(path):
+        if not isinstance(node, dict) or k not in node:
+            return path[:i + 1]
+        node = node[k]
+    return path
+
+
+def _apply(data, op) -> None:
+    """Apply a journal operation to data.
+
+    :data: dict to update in place
+    :op: [path, value] to set, [path] to delete
+
+    """
+    if not isinstance(op, list) or not op or not isinstance(op[0], list) or not op[0]:
+        return
+    path = op[0]
+    node = data
+    for k in path[:-1]:
+        child = node.get(k)
+        if not isinstance(child, dict):
+            if len(op) == 1:
+                return
+            child = node[k] = {}
+        node = child
+    if len(op) == 1:
+        node.pop(path[-1], None)
+    else:
+        node[path[-1]] = op[1]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Lookup(object):
+    """Runs a callable on a daemon thread so its result can be waited for
+    with a timeout. Unlike concurrent.futures workers, a lookup that never
+    returns (eg a wedged X server) doesn't keep the process from exiting."""
+
+    def __init__(self, fn, *args, **kwargs) -> None:
+        """Constructor, starts running fn(*args, **kwargs) right away.
+
+        :fn: callable to run
+
+        """
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._value = None
+        self._error = None
+        self._done = threading.Event()
+        thread = threading.Thread(target=self._run, name='rft-lookup',
+                                  daemon=True)
+        thread.start()
+
+    def _run(self) -> None:
+        try:
+            self._value = self._fn(*self._args, **self._kwargs)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def done(self) -> bool:
+        """Return True once the callable has returned or raised."""
+        return self._done.is_set()
+
+    def result(self, timeout=None, default=None):
+        """Return the callable's result, or default if it didn't finish within
+        timeout seconds or raised.
+
+        :timeout: seconds to wait, None to wait forever
+        :default: value returned on timeout or error
+
+        """
+        if not self._done.wait(timeout):
+            logger.debug('{} timed out after {}s'.format(
+                getattr(self._fn, '__name__', self._fn), timeout))
+            return default
+        if self._error is not None:
+            logger.debug('{} failed: {}'.format(
+                getattr(self._fn, '__name__', self._fn), self._error))
+            return default
+        return self._value
+
+
+def background(fn, *args, **kwargs) -> Lookup:
+    """Start running fn(*args, **kwargs) on a daemon thread.
+
+    :fn: callable to run
+
+    """
+    return Lookup(fn, *args, **kwargs)
+
+
+def bounded_map(fn, items, workers, timeout=None) -> dict:
+    """Call fn on every item using at most workers daemon threads, and return
+    a dict mapping items to their results.
+
+    Items whose call raised, or that weren't done within timeout seconds, are
+    left out.
+
+    :fn: callable taking an item
+    :items: hashable items
+    :workers: maximum number of concurrent calls
+    :timeout: seconds to wait overall, None to wait for every item
+
+    """
+    todo = deque(items)
+    done = {}
+    lock = threading.Lock()
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def work():
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                item = todo.popleft()
+            except IndexError:
+                return
+            try:
+                value = fn(item)
+            except Exception as e:
+                logger.debug('{} failed on {}: {}'.format(
+                    getattr(fn, '__name__', fn), item, e))
+                continue
+            with lock:
+                done[item] = value
+
+    threads = [threading.Thread(target=work, name='rft-worker', daemon=True)
+               for _ in range(min(workers, len(todo)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+    with lock:
+        return dict(done)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .snapshot import SEP, ClientRec, TmuxSnapshot, _format, _int
+from collections import deque
+import logging
+import subprocess
+import threading
+import time
+
+WINDOW_FMT = _format(('session_id', 'session_name', 'window_id',
+                      'window_index', 'window_name', 'window_active'))
+CLIENT_FMT = _format(('client_name', 'client_control_mode', 'client_activity',
+                      'client_tty', 'session_id'))
+# tmux has no notification for windows changing index (renumber-windows,
+# swap-window, move-window -r), so the index of every window is subscribed to.
+INDEX_SUBSCRIPTION = 'rft-windows'
+INDEX_FMT = '#{S:#{W:#{session_id}#{window_id}=#{window_index} }}'
+
+
+class TmuxControlModel(object):
+    """Live model of tmux sessions and windows fed by a tmux control mode
+    client (`tmux -C`).
+
+    Notifications are applied incrementally on a background thread, so
+    snapshot() answers without any tmux round-trip. The whole model is only
+    re-fetched when it can't be trusted anymore: on (re)connect, when sessions
+    come and go, when a notification references something unknown, or when
+    window indexes moved behind its back. Closing a window or changing its
+    layout only re-fetches the windows of the sessions it is linked to.
+
+    """
+
+    def __init__(self, server=None, logger=None, retry_interval=2.0) -> None:
+        """Constructor
+
+        :server: libtmux.Server whose socket to attach to
+        :logger: logger to report to
+        :retry_interval: seconds to wait before re-attaching
+
+        """
+        self._tmux = ['tmux']
+        if server is not None and server.socket_name:
+            self._tmux += ['-L', server.socket_name]
+        if server is not None and server.socket_path:
+            self._tmux += ['-S', str(server.socket_path)]
+        self.logger = logger or logging.getLogger(__name__)
+        self._retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._synced = threading.Event()
+        self._proc = None
+        self._thread = None
+        self._pending = deque()
+        self._block = None
+        self._client = None
+        # window ids whose info was requested but not received yet
+        self._adding = set()
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forget everything known about tmux."""
+        # session id -> name
+        self._sessions = {}
+        # (session id, window id) -> [index, name]
+        self._windows = {}
+        # session id -> active window id
+        self._active = {}
+        # client name -> [session id, activity, tty], control mode clients
+        # left out
+        self._clients = {}
+        self._synced.clear()
+
+    def start(self) -> None:
+        """Attach and keep the model updated on a daemon thread."""
+        self._thread = threading.Thread(target=self._run, name='rft-tmux-control',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Detach the control client."""
+        self._stopped.set()
+        proc = self._proc
+        if proc and proc.poll() is None:
+            proc.terminate()
+
+    def wait_synced(self, timeout=None) -> bool:
+        """Wait until the model holds a full view of tmux.
+
+        :timeout: seconds to wait, None to wait forever
+
+        """
+        return self._synced.wait(timeout)
+
+    def snapshot(self) -> TmuxSnapshot:
+        """Return a TmuxSnapshot built from the model, or None when the model
+        isn't in sync with tmux."""
+        with self._lock:
+            if not self._synced.is_set():
+                return None
+            attached = set(c[0] for c in self._clients.values())
+            clients = [(name,) + tuple(c) for name, c in self._clients.items()]
+            rows = []
+            for (s_id, w_id), (w_index, w_name) in self._windows.items():
+                rows.append((
+                    s_id,
+                    self._sessions.get(s_id, ''),
+                    '1' if s_id in attached else '0',
+                    w_id,
+                    w_index,
+                    w_name,
+                    '1' if self._active.get(s_id) == w_id else '0',
+                    '',
+                    ''))
+        rows.sort(key=lambda r: (r[1], _int(r[4])))
+        snap = TmuxSnapshot()
+        snap._load_rows(rows)
+        # switching without naming a client would pick our own.
+        snap.clients = [ClientRec(name, activity, tty, snap.sessions_by_id.get(s_id))
+                        for name, s_id, activity, tty in clients]
+        snap.clients_known = True
+        return snap
+
+    def _run(self) -> None:
+        """Attach, consume notifications, and re-attach until stopped."""
+        while not self._stopped.is_set():
+            try:
+                self._proc = subprocess.Popen(
+                    self._tmux + ['-C', 'attach-session', '-f',
+                                  'no-output,ignore-size,read-only'],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL)
+            except OSError as e:
+                self.logger.debug('tmux control mode unavailable: {}'.format(e))
+                return
+            self._pending.clear()
+            self._adding.clear()
+            self._block = None
+            self._resync()
+            for line in self._proc.stdout:
+                self._dispatch(line.decode('utf-8', 'replace').rstrip('\n'))
+            self._proc.wait()
+            with self._lock:
+                self._reset()
+            self.logger.debug('tmux control client exited, re-attaching')
+            self._stopped.wait(self._retry_interval)
+
+    def _send(self, command, callback) -> None:
+        """Send a command over the control channel.
+
+        :command: tmux command line
+        :callback: called with the list of output lines, None on error
+
+        """
+        self._pending.append(callback)
+        try:
+            self._proc.stdin.write(command.encode() + b'\n')
+            self._proc.stdin.flush()
+        except (OSError, ValueError):
+            pass
+
+    def _resync(self) -> None:
+        """Re-fetch every session, window and client."""
+        self.logger.debug('tmux control model: full resync')
+        self._send("list-windows -a -F '{}'".format(WINDOW_FMT), self._on_windows)
+        self._send("list-clients -F '{}'".format(CLIENT_FMT), self._on_clients)
+
+    def _refetch(self, s_ids) -> None:
+        """Re-fetch the windows of some sessions.
+
+        :s_ids: session ids
+
+        """
+        for s_id in s_ids:
+            self._send("list-windows -t '{}' -F '{}'".format(s_id, WINDOW_FMT),
+                       lambda lines, s_id=s_id: self._on_session_windows(s_id, lines))
+
+    def _linked(self, w_id) -> set:
+        """Return the ids of the sessions a window is linked to.
+
+        :w_id: window id
+
+        """
+        return set(k[0] for k in self._windows if k[1] == w_id)
+
+    def _dispatch(self, line) -> None:
+        """Handle a single line coming from the control client.
+
+        :line: line sans trailing newline
+
+        """
+        if self._block is not None:
+            if line.startswith(('%end ', '%error ')) and line.split(' ')[3:4] == ['1']:
+                lines, self._block = self._block, None
+                callback = self._pending.popleft() if self._pending else None
+                if callback:
+                    with self._lock:
+                        callback(lines if line.startswith('%end') else None)
+            else:
+                self._block.append(line)
+            return
+        if line.startswith('%begin '):
+            # only blocks of commands we sent are flagged with 1.
+            if line.split(' ')[3:4] == ['1']:
+                self._block = []
+            return
+        if not line.startswith('%'):
+            return
+        event, _, args = line.partition(' ')
+        handler = getattr(self, '_on_' + event[1:].replace('-', '_'), None)
+        if handler:
+            with self._lock:
+                handler(args)
+
+    def _gap(self, reason) -> None:
+        """Notifications don't add up with our model anymore: resync.
+
+        :reason: description of what didn't add up
+
+        """
+        self.logger.debug('tmux control model gap: {}'.format(reason))
+        self._synced.clear()
+        self._resync()
+
+    def _on_client_name(self, lines) -> None:
+        self._client = lines[0] if lines else None
+
+    def _on_windows(self, lines) -> None:
+        self._sessions.clear()
+        self._windows.clear()
+        self._active.clear()
+        self._add_windows(lines or [])
+
+    def _add_windows(self, lines) -> None:
+        for line in lines:
+            fields = line.split(SEP)
+            if len(fields) != 6:
+                continue
+            s_id, s_name, w_id, w_index, w_name, w_active = fields
+            self._sessions[s_id] = s_name
+            self._windows[(s_id, w_id)] = [w_index, w_name]
+            if w_active == '1':
+                self._active[s_id] = w_id
+
+    def _on_clients(self, lines) -> None:
+        self._load_clients(lines)
+        self._synced.set()
+
+    def _load_clients(self, lines) -> None:
+        self._clients.clear()
+        for line in lines or []:
+            fields = line.split(SEP)
+            if len(fields) == 5 and fields[1] != '1':
+                name, _, activity, tty, s_id = fields
+                self._clients[name] = [s_id, _int(activity), tty]
+
+    def _on_session_windows(self, s_id, lines) -> None:
+        for key in [k for k in self._windows if k[0] == s_id]:
+            del self._windows[key]
+        if lines is None:
+            # the session is gone along with its last window.
+            self._sessions.pop(s_id, None)
+            self._active.pop(s_id, None)
+            return
+        self._add_windows(lines)
+
+    def _on_window_info(self, w_id, lines) -> None:
+        self._adding.discard(w_id)
+        for key in [k for k in self._windows if k[1] == w_id]:
+            del self._windows[key]
+        self._add_windows(lines or [])
+
+    def _on_sessions_changed(self, args) -> None:
+        self._gap('sessions changed')
+
+    def _on_session_renamed(self, args) -> None:
+        s_id, _, name = args.partition(' ')
+        if s_id not in self._sessions:
+            return self._gap('unknown session {}'.format(s_id))
+        self._sessions[s_id] = name
+
+    def _on_session_window_changed(self, args) -> None:
+        s_id, _, w_id = args.partition(' ')
+        if s_id not in self._sessions:
+            return self._gap('unknown session {}'.format(s_id))
+        if (s_id, w_id) not in self._windows and w_id not in self._adding:
+            # tmux announces a new window as active before %window-add.
+            self._on_window_add(w_id)
+        self._active[s_id] = w_id
+
+    def _on_window_add(self, args) -> None:
+        w_id = args.strip()
+        if w_id in self._adding:
+            return
+        self._adding.add(w_id)
+        self._send(
+            "list-windows -a -F '{}' -f '#{{==:#{{window_id}},{}}}'".format(WINDOW_FMT, w_id),
+            lambda lines: self._on_window_info(w_id, lines))
+
+    _on_unlinked_window_add = _on_window_add
+
+    def _on_window_close(self, args) -> None:
+        w_id = args.strip()
+        s_ids = self._linked(w_id)
+        for s_id in s_ids:
+            del self._windows[(s_id, w_id)]
+        # with renumber-windows, the windows after it moved down.
+        self._refetch(s_ids)
+
+    _on_unlinked_window_close = _on_window_close
+
+    def _on_window_renamed(self, args) -> None:
+        w_id, _, name = args.partition(' ')
+        keys = [k for k in self._windows if k[1] == w_id]
+        if not keys and w_id not in self._adding:
+            return self._gap('unknown window {}'.format(w_id))
+        for key in keys:
+            self._windows[key][1] = name
+
+    _on_unlinked_window_renamed = _on_window_renamed
+
+    def _on_layout_change(self, args) -> None:
+        self._refetch(self._linked(args.partition(' ')[0]))
+
+    def _on_subscription_changed(self, args) -> None:
+        name, _, rest = args.partition(' ')
+        if name != INDEX_SUBSCRIPTION:
+            return
+        indexes = set()
+        for item in rest.partition(' : ')[2].split():
+            ids, _, w_index = item.partition('=')
+            s_id, _, w_id = ids.partition('@')
+            indexes.add((s_id, '@' + w_id, w_index))
+        known = set((s_id, w_id, w[0]) for (s_id, w_id), w in self._windows.items())
+        if indexes != known:
+            self._gap('window indexes moved')
+
+    def _on_session_changed(self, args) -> None:
+        # our own client is attached: commands sent before that ran without
+        # a client to act on.
+        self._send("display-message -p '#{client_name}'", self._on_client_name)
+        # tmux reports the value right away, then at most once a second when
+        # it changes.
+        self._send("refresh-client -B '{}::{}'".format(INDEX_SUBSCRIPTION, INDEX_FMT), None)
+
+    def _on_client_session_changed(self, args) -> None:
+        client, _, rest = args.partition(' ')
+        s_id = rest.partition(' ')[0]
+        if client == self._client:
+            return
+        if client not in self._clients:
+            # a client attaching, whose tty we don't know yet.
+            self._send("list-clients -F '{}'".format(CLIENT_FMT), self._load_clients)
+            self._clients[client] = [s_id, int(time.time()), '']
+            return
+        # it just switched, which makes it the most recently active one.
+        self._clients[client][:2] = [s_id, int(time.time())]
+
+    def _on_client_detached(self, args) -> None:
+        self._clients.pop(args.strip(), None)
+
+    def _on_exit(self, args) -> None:
+        self._synced.clear()
+
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .runtime import runtime_file
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+SOCKET_NAME = 'rft.sock'
+# max size of a single request/response line.
+MAX_MSG = 1 << 20
+# seconds to wait for the daemon to take a request. A client giving up runs
+# the command in-process instead, which it mustn't once the daemon has it.
+CONNECT_TIMEOUT = 1.0
+# options taking a path, resolved by the client since the daemon has a
+# working directory of its own.
+PATH_OPTIONS = ('--dir',)
+
+
+def socket_path() -> str:
+    """Return the Unix socket path the daemon listens on."""
+    return os.environ.get('RFT_SOCKET') or runtime_file(SOCKET_NAME)
+
+
+def _recv_line(conn) -> bytes:
+    """Read a single newline terminated message from conn."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if chunk.endswith(b'\n') or size > MAX_MSG:
+            break
+    return b''.join(chunks)
+
+
+def _absolute_paths(argv) -> list:
+    """Return argv with the values of PATH_OPTIONS made absolute.
+
+    :argv: command line arguments, sans program name
+
+    """
+    args = []
+    it = iter(argv)
+    for arg in it:
+        option, eq, value = arg.partition('=')
+        if option in PATH_OPTIONS and eq:
+            arg = option + '=' + os.path.abspath(value)
+        elif arg in PATH_OPTIONS:
+            value = next(it, None)
+            args.append(arg)
+            if value is None:
+                break
+            arg = os.path.abspath(value)
+        args.append(arg)
+    return args
+
+
+def forward(argv) -> int:
+    """Forward a command line to a running daemon.
+
+    Returns the command exit code, or None if no daemon is reachable, in which
+    case the caller is expected to run the command in-process. Once sent, the
+    reply is waited for as long as it takes, menus included: the daemon may
+    have acted already, so the command is never run a second time.
+
+    :argv: command line arguments, sans program name
+
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_path())
+    except OSError:
+        sock.close()
+        return None
+    try:
+        # the pane we run from, whose client the daemon is to act on.
+        pane = os.environ.get('TMUX_PANE') if os.environ.get('TMUX') else None
+        req = {'argv': _absolute_paths(argv), 'pane': pane, 'time': time.time()}
+        sock.sendall(json.dumps(req).encode() + b'\n')
+    except OSError:
+        sock.close()
+        return None
+    try:
+        sock.settimeout(None)
+        reply = json.loads(_recv_line(sock).decode())
+    except (OSError, ValueError):
+        sys.stderr.write('rft: lost the connection to the daemon\n')
+        return 1
+    finally:
+        sock.close()
+    out = reply.get('out')
+    if out:
+        os.write(1, out.encode())
+    return reply.get('code', 1)
+
+
+class Daemon(object):
+    """Long-lived process keeping RFT state warm and serving rft commands over
+    a Unix socket."""
+
+    def __init__(self, cli, factory, logger) -> None:
+        """Constructor
+
+        :cli: click group used to dispatch forwarded command lines
+        :factory: callable returning a fresh RFT instance
+        :logger: logger to report to
+
+        """
+        self._cli = cli
+        self._factory = factory
+        self._rft = None
+        self._path = socket_path()
+        self._sock = None
+        # last command line served and when it was done, see _serve
+        self._last = (None, 0)
+        self.logger = logger
+
+    def _bind(self) -> None:
+        """Bind the listening socket, replacing a stale one if needed."""
+        if os.path.exists(self._path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._path)
+            except OSError:
+                os.unlink(self._path)
+            else:
+                raise RuntimeError('rft daemon already running on {}'.format(self._path))
+            finally:
+                probe.close()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            self._sock.bind(self._path)
+        finally:
+            os.umask(old_umask)
+        self._sock.listen(8)
+
+    def serve_forever(self) -> None:
+        """Accept and serve requests one at a time until terminated."""
+        self._bind()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.close())
+        self.logger.info('rft daemon listening on {}'.format(self._path))
+        try:
+            while self._sock:
+                try:
+                    conn, _ = self._sock.accept()
+                except OSError:
+                    break
+                with conn:
+                    self._serve(conn)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop serving and remove the socket."""
+        sock, self._sock = self._sock, None
+        if sock:
+            sock.close()
+            with contextlib.suppress(OSError):
+                os.unlink(self._path)
+
+    def _serve(self, conn) -> None:
+        """Handle a single request.
+
+        :conn: accepted client connection
+
+        """
+        try:
+            req = json.loads(_recv_line(conn).decode() or '{}')
+        except ValueError:
+            return
+        argv = req.get('argv', [])
+        last_argv, last_done = self._last
+        if argv == last_argv and req.get('time', last_done) < last_done:
+            # sent while the very same command was being served, eg key
+            # repeat: it's been taken care of.
+            self.logger.debug('dropping queued duplicate {}'.format(argv))
+            code, out = 0, ''
+        else:
+            code, out = self._run(argv, req.get('pane'))
+            self._last = (argv, time.time())
+        with contextlib.suppress(OSError):
+            conn.sendall(json.dumps({'code': code, 'out': out}).encode() + b'\n')
+
+    def _run(self, argv, pane=None) -> tuple:
+        """Run a command line against the warm RFT instance.
+
+        :argv: command line arguments, sans program name
+        :pane: tmux pane the command was run from, if any
+
+        """
+        import click
+
+        buf = io.StringIO()
+        code = 0
+        try:
+            if self._rft is None:
+                self._rft = self._factory()
+            else:
+                self._rft.refresh()
+            self._rft.caller_pane = pane
+            with contextlib.redirect_stdout(buf):
+                res = self._cli.main(args=argv, prog_name='rft', obj=self._rft,
+                                     standalone_mode=False)
+            if isinstance(res, int):
+                code = res
+        except click.ClickException as e:
+            e.show(file=buf)
+            code = e.exit_code
+        except click.exceptions.Exit as e:
+            code = e.exit_code
+        except click.exceptions.Abort:
+            code = 1
+        except Exception as e:
+            # drop warm state, eg i3 got restarted under us.
+            self.logger.exception('failed to serve {}'.format(argv))
+            self._rft = None
+            buf.write('rft daemon: {}\n'.format(e))
+            code = 1
+        return code, buf.getvalue()
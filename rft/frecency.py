@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import time
+
+
+class Frecency(object):
+    """Bounded, exponentially decaying frecency store.
+
+    Each key holds a single float, its score expressed in log2 space relative
+    to the epoch: v = log2(score at t) + t / half_life. Decay doesn't change
+    the order of keys, so ranking is a plain sort on v and a hit only touches
+    its own key.
+
+    """
+
+    def __init__(self, data, half_life=259200.0, max_items=1000,
+                 activity_weight=0.0) -> None:
+        """Constructor
+
+        :data: dict mapping keys to their v, updated in place (eg a cache entry)
+        :half_life: seconds after which a hit counts half as much
+        :max_items: keys kept when evicting
+        :activity_weight: weight of tmux activity timestamps when ranking
+
+        """
+        self._items = data
+        self._half_life = float(half_life)
+        self._max_items = max_items
+        self._activity_weight = activity_weight
+
+    def hit(self, key, now=None) -> None:
+        """Record a use of key.
+
+        :key: entry key
+        :now: unix time of the use, defaults to now
+
+        """
+        offset = (time.time() if now is None else now) / self._half_life
+        v = self._items.get(key)
+        if v is None:
+            self._items[key] = offset
+        else:
+            # log2(2 ** (v - offset) + 1) + offset, without overflowing
+            d = v - offset
+            self._items[key] = offset + (d + math.log2(1 + 2 ** -d) if d > 0
+                                         else math.log2(1 + 2 ** d))
+        if len(self._items) > self._max_items * 1.25:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop the lowest scored keys down to max_items."""
+        keep = sorted(self._items.items(), key=lambda kv: kv[1], reverse=True)
+        self._items.clear()
+        self._items.update(keep[:self._max_items])
+
+    def rank(self, entries, key, activity=None, now=None) -> list:
+        """Return entries sorted by descending score, keeping their original
+        order among equal scores (eg entries never used).
+
+        :entries: iterable of entries
+        :key: callable returning the key of an entry
+        :activity: optional callable returning an entry's last activity
+                   unix time, blended in with activity_weight
+        :now: unix time to rank at, defaults to now
+
+        """
+        get = self._items.get
+        ninf = -math.inf
+        if not self._activity_weight or activity is None:
+            return sorted(entries, key=lambda e: -get(key(e), ninf))
+        offset = (time.time() if now is None else now) / self._half_life
+        weight = self._activity_weight
+        half_life = self._half_life
+
+        def score(e):
+            v = get(key(e))
+            s = 2 ** (v - offset) if v is not None else 0.0
+            act = activity(e)
+            if act:
+                s += weight * 2 ** (act / half_life - offset)
+            return -s
+
+        return sorted(entries, key=score)
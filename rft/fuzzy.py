@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# characters after which a match counts as the start of a word.
+BOUNDARIES = ':. -_/'
+
+
+def _bit(c) -> int:
+    """Return the mask bit of a character: letters and digits get one each,
+    every other character shares one of the remaining 28.
+
+    :c: lowercase character
+
+    """
+    if 'a' <= c <= 'z':
+        return ord(c) - ord('a')
+    if '0' <= c <= '9':
+        return 26 + ord(c) - ord('0')
+    return 36 + ord(c) % 28
+
+
+# bit of every ASCII character in masks, see _mask
+_BITS = {chr(i): 1 << _bit(chr(i)) for i in range(128)}
+
+
+def _mask(text) -> int:
+    """Return the bitmask of the characters in text, folded into 64 bits.
+
+    Letters and digits, which make most of a query, never share a bit, nor
+    do the BOUNDARIES. Other characters may, letting entries through the
+    prefilter they then fail scoring on.
+
+    :text: lowercase text
+
+    """
+    mask = 0
+    get = _BITS.get
+    for c in set(text):
+        mask |= get(c) or 1 << _bit(c)
+    return mask
+
+
+def score(query, text) -> int:
+    """Score how well query matches text as a subsequence, None if it
+    doesn't.
+
+    The shortest window holding the subsequence found going forward then back
+    is scored: every matched character, more for consecutive ones and ones
+    starting a word, less for every character skipped in between, and a
+    bonus when text starts with query.
+
+    :query: lowercase query
+    :text: lowercase text
+
+    """
+    pos = 0
+    for c in query:
+        pos = text.find(c, pos)
+        if pos < 0:
+            return None
+        pos += 1
+    end = pos
+    for c in reversed(query):
+        pos = text.rfind(c, 0, pos)
+    start = pos
+    total = 0
+    prev = -2
+    pos = start
+    for c in query:
+        pos = text.find(c, pos)
+        total += 16
+        if pos == prev + 1:
+            total += 8
+        if pos == 0 or text[pos - 1] in BOUNDARIES:
+            total += 10
+        prev = pos
+        pos += 1
+    total -= end - start - len(query)
+    if text.startswith(query):
+        total += 20
+    return total
+
+
+class FuzzyIndex(object):
+    """Fuzzy matcher over a fixed list of entries.
+
+    Matches of the last query are kept, so that a query extending it, as when
+    typing, only scores those. Once the index served a second search from
+    scratch, each entry's character bitmask is computed, so entries lacking
+    any character of the query are skipped without being scored: building
+    the masks costs several times a single search over every entry.
+
+    """
+
+    def __init__(self, entries) -> None:
+        """Constructor
+
+        :entries: entry strings, in the order ties are broken by
+
+        """
+        self.entries = entries
+        self._texts = [e.lower() for e in entries]
+        self._masks = None
+        self._scanned = False
+        self._last = None
+
+    def search(self, query) -> list:
+        """Return the indexes of the entries matching query, best first.
+
+        :query: text to look for, case insensitively
+
+        """
+        query = query.lower()
+        texts = self._texts
+        if self._last and query.startswith(self._last[0]):
+            candidates = self._last[1]
+        else:
+            candidates = range(len(texts))
+            if self._scanned and self._masks is None:
+                self._masks = [_mask(t) for t in texts]
+            self._scanned = True
+        masks = self._masks
+        mask = _mask(query)
+        scored = []
+        for i in candidates:
+            if masks is not None and mask & masks[i] != mask:
+                continue
+            s = score(query, texts[i])
+            if s is not None:
+                scored.append((-s, i))
+        self._last = (query, [i for _, i in scored])
+        scored.sort()
+        return [i for _, i in scored]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# bumped whenever HOOKS change, so outdated ones get replaced.
+HOOKS_VERSION = '1'
+# hook array index, high enough to stay clear of the user's own hooks.
+HOOK_INDEX = 90
+WINDOW_LABEL = '#{session_name}:#{window_index}:#{window_name}'
+
+# Each hook rotates the current session/window into @rft_last_s/@rft_last_w,
+# so they always hold what was switched away from, whoever switched. Window
+# changes of sessions nobody is looking at don't count.
+HOOKS = {
+    'client-session-changed': (
+        "set -gF @rft_last_s '#{@rft_cur_s}' ; "
+        "set -gF @rft_cur_s '#{session_name}' ; "
+        "set -gF @rft_last_w '#{@rft_cur_w}' ; "
+        "set -gF @rft_cur_w '" + WINDOW_LABEL + "'"),
+    'session-window-changed': (
+        "if -F '#{session_attached}' { "
+        "set -gF @rft_last_w '#{@rft_cur_w}' ; "
+        "set -gF @rft_cur_w '" + WINDOW_LABEL + "' }"),
+}
+
+
+def _hook(name) -> str:
+    return '{}[{}]'.format(name, HOOK_INDEX)
+
+
+def install_commands() -> list:
+    """Return the tmux commands installing the switch tracking hooks."""
+    commands = [('set-hook', '-g', _hook(name), command)
+                for name, command in sorted(HOOKS.items())]
+    return commands + [('set-option', '-g', '@rft_hooks', HOOKS_VERSION)]
+
+
+def uninstall_commands() -> list:
+    """Return the tmux commands removing the switch tracking hooks and their
+    options."""
+    commands = [('set-hook', '-gu', _hook(name)) for name in sorted(HOOKS)]
+    return commands + [('set-option', '-gu', option) for option in
+                       ('@rft_hooks', '@rft_cur_s', '@rft_last_s', '@rft_cur_w',
+                        '@rft_last_w')]
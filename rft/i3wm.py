@@ -2,13 +2,64 @@
 # -*- coding: utf-8 -*-
 
 from .window_manager import WindowManager
+from .visibility import make_backend
 import i3ipc
 import logging
-from re import escape
-from subprocess import check_output
+import re
+import threading
 from collections import defaultdict
 
 
+class ConRef(object):
+    """Compact reference to an i3 window container."""
+
+    __slots__ = ('id', 'window', 'name', 'type', 'workspace', 'path', 'output')
+
+    def __init__(self, id, window, name, type, workspace, path=(), output=None) -> None:
+        self.id = id
+        self.window = window
+        self.name = name
+        self.type = type
+        self.workspace = workspace
+        # (container id, child id) for every tabbed/stacked ancestor
+        self.path = path
+        self.output = output
+
+    def __repr__(self) -> str:
+        return 'ConRef({}, {!r}, {})'.format(self.id, self.name, self.workspace)
+
+
+def _index_tree(tree) -> tuple:
+    """Walk an i3 tree once and index its window containers by con id.
+
+    Returns the index along with the focused child id of every tabbed or
+    stacked container.
+
+    :tree: i3ipc.Con root container
+
+    """
+    index = {}
+    tab_focus = {}
+    stack = [(tree, None, None, ())]
+    while stack:
+        con, output, workspace, path = stack.pop()
+        if con.type == 'output':
+            output = con.name
+        elif con.type == 'workspace':
+            workspace = con.name
+        elif con.type.endswith('con') and con.window:
+            index[con.id] = ConRef(con.id, con.window, con.name or '', con.type,
+                                   workspace, path, output)
+        tabbed = con.layout in ('tabbed', 'stacked')
+        if tabbed and con.focus:
+            tab_focus[con.id] = con.focus[0]
+        # push children reversed so they're indexed in tree order.
+        for child in reversed(con.nodes + con.floating_nodes):
+            child_path = path + ((con.id, child.id),) if tabbed else path
+            stack.append((child, output, workspace, child_path))
+    return index, tab_focus
+
+
 class i3WM(WindowManager):
     """Abstraction to handle i3wm"""
 
@@ -18,14 +69,142 @@ class i3WM(WindowManager):
 
         """
         self._i3 = i3ipc.Connection()
-        self._cur_ws_id = self._get_cur_workspace()
+        # con id -> ConRef, fetched at most once per operation
+        self._index = None
+        self._tab_focus = None
+        # (focused workspace name, visible workspace names)
+        self._workspaces = None
+        self._watching = False
+        self._lock = threading.Lock()
         self._conf = conf
         self.logger = logging.getLogger(__name__)
         if logger_lvl:
             self.logger.setLevel(logger_lvl)
+        self._visibility = make_backend(conf.get('visibility'), self)
 
         super(i3WM, self).__init__()
 
+    def refresh(self) -> None:
+        """Forget the i3 tree and focused workspace seen by the last operation,
+        unless they're being kept up to date by i3 events
+
+        """
+        if not self._watching:
+            self._index = None
+            self._workspaces = None
+
+    def watch(self) -> None:
+        """Keep the window index up to date from i3 events, for long-lived
+        processes
+
+        """
+        if self._watching:
+            return
+        self._watching = True
+        thread = threading.Thread(target=self._watch, name='rft-i3-events',
+                                  daemon=True)
+        thread.start()
+
+    def _watch(self) -> None:
+        """Subscribe to i3 events and run the event loop."""
+        try:
+            conn = i3ipc.Connection()
+            conn.on(i3ipc.Event.WINDOW_TITLE, self._on_window_title)
+            conn.on(i3ipc.Event.WINDOW_CLOSE, self._on_window_close)
+            conn.on(i3ipc.Event.WINDOW_NEW, self._on_layout_change)
+            conn.on(i3ipc.Event.WINDOW_MOVE, self._on_layout_change)
+            conn.on(i3ipc.Event.WINDOW_FLOATING, self._on_layout_change)
+            conn.on(i3ipc.Event.WORKSPACE_RENAME, self._on_layout_change)
+            conn.on(i3ipc.Event.WINDOW_FOCUS, self._on_window_focus)
+            conn.on(i3ipc.Event.WORKSPACE_FOCUS, self._on_workspace_focus)
+            conn.main()
+        except Exception as e:
+            self.logger.debug('i3 event loop stopped: {}'.format(e))
+        with self._lock:
+            self._watching = False
+            self._index = None
+            self._workspaces = None
+
+    def _on_window_title(self, conn, event) -> None:
+        with self._lock:
+            ref = self._index.get(event.container.id) if self._index else None
+            if ref:
+                ref.name = event.container.name or ''
+
+    def _on_window_close(self, conn, event) -> None:
+        # copy on write: lookups iterate the index _get_index returned them
+        # without holding the lock.
+        with self._lock:
+            if self._index and event.container.id in self._index:
+                index = dict(self._index)
+                del index[event.container.id]
+                self._index = index
+
+    def _on_layout_change(self, conn, event) -> None:
+        # containers moved around: re-walk the tree on next use.
+        with self._lock:
+            self._index = None
+
+    def _on_window_focus(self, conn, event) -> None:
+        # focusing a window raises it within its tabbed/stacked ancestors.
+        with self._lock:
+            ref = self._index.get(event.container.id) if self._index else None
+            if ref:
+                self._tab_focus.update(ref.path)
+
+    def _on_workspace_focus(self, conn, event) -> None:
+        with self._lock:
+            self._workspaces = None
+
+    def _get_index(self) -> dict:
+        """Return the window index, fetching the i3 tree if needed. The index
+        returned is never modified, i3 events replace it instead."""
+        with self._lock:
+            index = self._index
+        if index is None:
+            index, tab_focus = _index_tree(self._i3.get_tree())
+            with self._lock:
+                self._index = index
+                self._tab_focus = tab_focus
+        return index
+
+    def _get_workspaces(self) -> tuple:
+        """Return the focused workspace name and the set of visible workspace
+        names, from a single GET_WORKSPACES request."""
+        with self._lock:
+            workspaces = self._workspaces
+        if workspaces is None:
+            focused = None
+            visible = set()
+            for ws in self._i3.get_workspaces():
+                if ws.focused:
+                    focused = ws.name
+                if ws.visible:
+                    visible.add(ws.name)
+            workspaces = (focused, visible)
+            with self._lock:
+                self._workspaces = workspaces
+        return workspaces
+
+    def is_behind_sibling(self, i3_win) -> bool:
+        """Verify if given window is hidden behind another tab of a tabbed or
+        stacked container.
+
+        :i3_win: ConRef to check
+
+        """
+        self._get_index()
+        with self._lock:
+            return any(self._tab_focus.get(con_id) != child_id
+                       for con_id, child_id in i3_win.path)
+
+    def prefetch(self) -> None:
+        """Fetch the i3 tree and workspaces ahead of the lookups needing them
+
+        """
+        self._get_index()
+        self._get_workspaces()
+
     def focus_tmux_window(self, session) -> None:
         """Focuses window where given tmux session is running in
 
@@ -38,7 +217,7 @@ class i3WM(WindowManager):
         tmux_win = self._find_tmux_window(session)
         if tmux_win:
             self.logger.debug('i3 focusing window running tmux session [{}]'.format(session.name))
-            tmux_win.command('focus')
+            self._i3.command('[con_id={}] focus'.format(tmux_win.id))
 
     def is_tmux_win_visible(self, session) -> bool:
         """Verifies if window where given tmux session is running in is visible
@@ -51,57 +230,90 @@ class i3WM(WindowManager):
 
         tmux_win = self._find_tmux_window(session)
         if tmux_win:
-            return self._is_win_visible(tmux_win)
+            return self._visibility.visible([tmux_win])[tmux_win.id]
         return False
 
-    def _is_win_visible(self, i3_win) -> bool:
-        """Verify if given i3ipc.Con housing our tmux session is visible on our
-        screen(s).
+    def _is_tmux_win_on_current_ws(self, i3_win) -> bool:
+        """Verifies if tmux is in the current (ie focused) i3 workspace
 
-        :i3_win: i3ipc.Con housing tmux session whose visibility to test.
+        :i3_win: ConRef housing our tmux session
 
         """
-        try:
-            xprop = check_output(['xprop', '-id', str(i3_win.window)]).decode()
-            return '_NET_WM_STATE_HIDDEN' not in xprop
-        except FileNotFoundError:
-            # if xprop not found, fall back to just checking if tmux win is on our current worksapce:
-            self.logger.debug('xprop utility is not found - please install it.')
-            self.logger.debug('will decide visibility simply by checking if tmux is on our current workspace')
-            return self._is_tmux_win_on_current_ws(i3_win)
+        return i3_win.workspace is not None and i3_win.workspace == self._get_cur_workspace()
 
-    def _is_tmux_win_on_current_ws(self, i3_win) -> bool:
-        """Verifies if tmux is in the current (ie focused) i3 workspace
+    def _get_cur_workspace(self) -> str:
+        """Finds & returns the name of current (ie focused) workspace.
+
+        Uses GET_WORKSPACES, which is much cheaper than fetching the tree.
+
+        """
+        return self._get_workspaces()[0]
+
+    def annotate(self, sessions) -> dict:
+        """Locate the windows housing every given session in one walk over
+        the window index, and tell which of them are visible.
 
-        :i3_win: i3ipc.Con housing our tmux session
+        Returns a dict mapping session names to (ConRef, visible), for the
+        sessions whose window was found.
+
+        :sessions: tmux sessions to locate
 
         """
-        workspace = i3_win.workspace()
-        return workspace and workspace.id == self._cur_ws_id
+        found = self._match_sessions(sessions)
+        visible = self._visibility.visible(found.values()) if found else {}
+        return {name: (ref, visible[ref.id]) for name, ref in found.items()}
+
+    def _match_sessions(self, sessions) -> dict:
+        """Map session names to the first window whose title matches their
+        tmux_title_rgx, matching every title once against a single
+        alternation of all the sessions' regexes.
 
-    def _get_cur_workspace(self) -> int:
-        """Finds & returns the id of current (ie focused) workspace.
+        :sessions: tmux sessions to locate
 
         """
-        return self._i3.get_tree().find_focused().workspace().id
+        # longest names first, so 'foo-bar' wins over 'foo' on the same title.
+        ordered = sorted(sessions, key=lambda s: len(s.name), reverse=True)
+        if not ordered:
+            return {}
+        try:
+            rgx = re.compile('|'.join('(?P<s{}>{})'.format(i, self._title_rgx(s))
+                                      for i, s in enumerate(ordered)))
+        except re.error as e:
+            # eg numbered backreferences, which don't survive the alternation.
+            self.logger.debug('cannot combine title regexes ({}), matching one by one'.format(e))
+            found = {s.name: self._find_tmux_window(s) for s in ordered}
+            return {name: ref for name, ref in found.items() if ref}
+        found = {}
+        for ref in self._get_index().values():
+            m = rgx.search(ref.name)
+            if m:
+                name = ordered[int(m.lastgroup[1:])].name
+                found.setdefault(name, ref)
+        return found
 
-    def _find_tmux_window(self, session) -> i3ipc.Con:
-        """Finds and returns i3 Container instance housing tmux window that's
-        currently attached to provided session.
+    def _title_rgx(self, session) -> str:
+        """Format tmux_title_rgx for session.
 
-        :session: tmux session whose window to find.
+        :session: tmux session
 
         """
-        session_name = escape(session.name)
-        window_name = escape(session.attached_window.name)
-        rgx = self._conf['tmux_title_rgx'].format_map(defaultdict(str,
+        session_name = re.escape(session.tmux_name)
+        window_name = re.escape(session.attached_window.name) if session.attached_window else ''
+        return self._conf['tmux_title_rgx'].format_map(defaultdict(str,
                 session = session_name,
                 window = window_name
         ))
 
-        tmux_win = self._i3.get_tree().find_named(rgx)
-        # just in case filter by container type - we want regular & floating window containers:
-        tmux_win = list(filter(lambda c: c.type.endswith('con'), tmux_win))
+    def _find_tmux_window(self, session) -> ConRef:
+        """Finds and returns the i3 window container housing tmux window that's
+        currently attached to provided session.
+
+        :session: tmux session whose window to find.
+
+        """
+        rgx = self._title_rgx(session)
+        pattern = re.compile(rgx)
+        tmux_win = [c for c in self._get_index().values() if pattern.search(c.name)]
 
         if tmux_win:
             if len(tmux_win) > 1:
@@ -112,4 +324,3 @@ class i3WM(WindowManager):
 
         self.logger.debug('found no windows using regex [{}]'.format(rgx))
         return None
-
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import subprocess
+
+
+class StreamingRofi(object):
+    """Spawns `rofi -dmenu` directly and streams entries into its stdin as
+    they're produced, so the menu shows up before the whole list exists."""
+
+    def __init__(self, pre_read=25, rofi_bin='rofi') -> None:
+        """Constructor
+
+        :pre_read: entries rofi reads before showing the menu
+        :rofi_bin: rofi executable
+
+        """
+        self._pre_read = pre_read
+        self._rofi_bin = rofi_bin
+
+    def _args(self, prompt, select) -> list:
+        args = [self._rofi_bin, '-dmenu', '-i', '-p', prompt, '-format', 'i',
+                '-async-pre-read', str(self._pre_read)]
+        if select:
+            args += ['-select', select]
+        return args
+
+    def select(self, prompt, entries, select=None) -> tuple:
+        """Show a menu and return the selected (index, key), python-rofi
+        style: key is 0 on selection, -1 when cancelled.
+
+        :prompt: rofi prompt
+        :entries: iterable of entry strings, consumed lazily
+        :select: entry string to preselect, if any
+
+        """
+        indexes, key = self._run(self._args(prompt, select), entries)
+        return (indexes[0] if indexes else -1), key
+
+    def select_many(self, prompt, entries, select=None) -> tuple:
+        """Show a -multi-select menu and return the selected (indexes, key),
+        key being as in select.
+
+        :prompt: rofi prompt
+        :entries: iterable of entry strings, consumed lazily
+        :select: entry string to preselect, if any
+
+        """
+        return self._run(self._args(prompt, select) + ['-multi-select'], entries)
+
+    def _run(self, args, entries) -> tuple:
+        """Run rofi, stream entries in and return (indexes, key).
+
+        :args: rofi command line
+        :entries: iterable of entry strings
+
+        """
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            for n, entry in enumerate(entries, 1):
+                proc.stdin.write(entry.encode('utf-8') + b'\n')
+                if n % self._pre_read == 0:
+                    proc.stdin.flush()
+        except BrokenPipeError:
+            # an entry was picked before everything was written.
+            pass
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                proc.stdin.close()
+        out = proc.stdout.read().decode('utf-8')
+        returncode = proc.wait()
+        indexes = [int(line) for line in out.split()]
+        if returncode == 0:
+            key = 0
+        elif returncode > 9:
+            key = returncode - 9
+        else:
+            key = -1
+        return indexes, key
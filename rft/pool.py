@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import shlex
+
+POOL_PREFIX = '_rft_pool_'
+
+
+def is_pool_session(session) -> bool:
+    """Verify if session is one of the pre-spawned ones.
+
+    :session: session record
+
+    """
+    return session.tmux_name.startswith(POOL_PREFIX)
+
+
+def session_name(name) -> str:
+    """Return name the way tmux would store it, which turns . and : into _.
+
+    :name: wanted session name
+
+    """
+    return name.replace('.', '_').replace(':', '_')
+
+
+class SessionPool(object):
+    """Detached sessions spawned ahead of time on the default tmux server, so
+    their shells are done starting up by the time a new session is wanted.
+
+    Claiming one renames it, and the pool gets topped up afterwards.
+
+    """
+
+    def __init__(self, server, size, snapshot, logger=None) -> None:
+        """Constructor
+
+        :server: libtmux.Server of the default tmux server
+        :size: number of sessions to keep spawned
+        :snapshot: TmuxSnapshot to find the spawned sessions in, None when
+                   there's no tmux server yet
+        :logger: logger to report to
+
+        """
+        self._server = server
+        self._size = size
+        self.logger = logger or logging.getLogger(__name__)
+        sessions = snapshot.sessions if snapshot else []
+        # oldest first, its shell has had the most time to start.
+        self._idle = sorted((s for s in sessions if s.server is None and is_pool_session(s)),
+                            key=lambda s: _int_suffix(s.name))
+        self._next = max([_int_suffix(s.name) for s in self._idle] + [0]) + 1
+
+    def claim(self, name, directory=None):
+        """Rename the oldest spawned session to name, and cd its shell into
+        directory. Returns its session record, None if the pool is empty.
+
+        :name: new session name
+        :directory: optional directory to cd into
+
+        """
+        if not self._idle:
+            return None
+        session = self._idle.pop(0)
+        commands = ['rename-session', '-t', session.id, '--', name]
+        if directory:
+            cd = 'cd -- {} && clear'.format(shlex.quote(os.path.expanduser(directory)))
+            commands += [';', 'send-keys', '-t', session.id + ':', '-l', cd,
+                         ';', 'send-keys', '-t', session.id + ':', 'Enter']
+        proc = self._server.cmd(*commands)
+        if proc.stderr:
+            self.logger.debug('could not claim {}: {}'.format(session.name, proc.stderr))
+            return None
+        self.logger.debug('claimed {} as {}'.format(session.name, name))
+        session.name = name
+        for w in session.windows:
+            w.relabel()
+        return session
+
+    def fill(self) -> None:
+        """Spawn sessions until the pool holds size of them."""
+        missing = self._size - len(self._idle)
+        if missing <= 0:
+            return
+        commands = []
+        home = os.path.expanduser('~')
+        for n in range(self._next, self._next + missing):
+            if commands:
+                commands.append(';')
+            commands += ['new-session', '-d', '-s', '{}{}'.format(POOL_PREFIX, n),
+                         '-c', home]
+        self._next += missing
+        proc = self._server.cmd(*commands)
+        if proc.stderr:
+            self.logger.debug('could not fill session pool: {}'.format(proc.stderr))
+
+
+def _int_suffix(name) -> int:
+    try:
+        return int(name[len(POOL_PREFIX):])
+    except ValueError:
+        return 0
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .concurrency import bounded_map
+import logging
+
+
+class PanePreviews(object):
+    """Last non-empty visible line of tmux panes.
+
+    Panes are captured on a bounded pool of daemon threads, under an overall
+    deadline, and each line is cached along with a stamp of the pane (its
+    history size and window activity), so panes that didn't change since the
+    last menu aren't captured again.
+
+    """
+
+    CACHE_KEY = 'previews'
+
+    def __init__(self, server, cache, workers=8, max_bytes=4096, timeout=0.5,
+                 logger=None) -> None:
+        """Constructor
+
+        :server: libtmux.Server to capture panes from
+        :cache: dict the previews are persisted in, usually RFT's cache
+        :workers: maximum number of concurrent captures
+        :max_bytes: bytes of content, from the bottom, looked at per pane
+        :timeout: seconds after which panes not captured yet are left blank
+        :logger: logger to report to
+
+        """
+        self._server = server
+        self._cache = cache
+        self._workers = workers
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.changed = False
+
+    def lines(self, panes) -> dict:
+        """Return a dict mapping pane ids to their last line.
+
+        :panes: pane records
+
+        """
+        cached = self._cache.setdefault(self.CACHE_KEY, {})
+        live = {p.id for p in panes}
+        dead = [pane_id for pane_id in cached if pane_id not in live]
+        for pane_id in dead:
+            del cached[pane_id]
+        res = {}
+        stale = []
+        for p in panes:
+            hit = cached.get(p.id)
+            if hit and hit[0] == p.stamp:
+                res[p.id] = hit[1]
+            else:
+                stale.append(p)
+        captured = bounded_map(self._capture, stale, self._workers, self._timeout)
+        for p in stale:
+            line = captured.get(p)
+            if line is None:
+                # missed the deadline: show it blank, try again next time.
+                res[p.id] = ''
+            else:
+                res[p.id] = line
+                cached[p.id] = [p.stamp, line]
+        self.changed = bool(dead or captured)
+        self.logger.debug('previews: {} cached, {} captured, {} missed'.format(
+            len(panes) - len(stale), len(captured), len(stale) - len(captured)))
+        return res
+
+    def _capture(self, pane) -> str:
+        """Return the last non-empty line within the bottom max_bytes of the
+        visible content of pane.
+
+        :pane: pane record
+
+        """
+        proc = self._server.cmd('capture-pane', '-p', '-t', pane.id)
+        budget = self._max_bytes
+        for line in reversed(proc.stdout):
+            data = line.encode('utf-8')
+            if data.strip():
+                return data[-budget:].decode('utf-8', 'ignore').strip()
+            budget -= len(data) + 1
+            if budget <= 0:
+                break
+        return ''
+
@@ -1,38 +1,151 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from .i3wm import i3WM
-import libtmux
+from .cache import CacheStore
+from .concurrency import background
+from .snapshot import TmuxSnapshot
+from functools import cached_property
+from operator import attrgetter
 import logging
 import json
 import os
-import rofi
-import subprocess
-logging.basicConfig(level=logging.INFO)
+import shlex
 
 
 class RFT(object):
-    """Abstraction to interface with rofi, tmux, tmuxinator."""
-
-    def __init__(self, debug=False):
-        """Initialize ."""
-        self._rofi = rofi.Rofi()
-        self._libts = libtmux.Server()
-        self._sessions = None
-        self._cur_tmux_s = None
+    """Abstraction to interface with rofi, tmux, tmuxinator.
+
+    Everything that talks to rofi, tmux or the window manager is resolved on
+    first use, so commands only pay for what they need.
+
+    """
+
+    def __init__(self, debug=False, tmux_model=None):
+        """Initialize .
+
+        :debug: if True, log at debug level
+        :tmux_model: optional live TmuxControlModel to read tmux state from
+
+        """
+        self._snapshot = None
+        self._tmux_model = tmux_model
+        # whether snapshots need panes too, see switch_pane
+        self._with_panes = False
+        self._watching = False
+        # cache read running in the background, see _start_lookups
+        self._cache_lookup = None
+        # fuzzy indexes of session and window labels, see _fuzzy_match
+        self._fuzzy = {}
+        # pane rft was run from, whose client to act on, see TmuxSnapshot.fetch
+        self.caller_pane = os.environ.get('TMUX_PANE') if os.environ.get('TMUX') else None
         self.logger = logging.getLogger(__name__)
         if debug:
             self.logger.setLevel(logging.DEBUG)
 
         homedir = os.environ.get('HOME')
         self._cache_f = os.path.join(homedir, '.rft.cache')
-        self._cache = self._load_cache()
-        self._config = self._load_config(os.path.join(homedir, '.rft'))
+        self._config_f = os.path.join(homedir, '.rft')
+        self._index_f = os.path.join(homedir, '.rft.grep.db')
+        self._workspace_d = os.path.join(homedir, '.rft.sessions')
+        self._config_mtime = None
+
+    @cached_property
+    def _rofi(self):
+        """rofi.Rofi launcher."""
+        import rofi
+
+        return rofi.Rofi()
+
+    @cached_property
+    def _libts(self):
+        """libtmux.Server on the default socket."""
+        import libtmux
+
+        return libtmux.Server()
+
+    @cached_property
+    def _config(self) -> dict:
+        """Effective config, see _load_config."""
+        self._config_mtime = _mtime(self._config_f)
+        return self._load_config(self._config_f)
+
+    @cached_property
+    def _cache(self) -> dict:
+        """Last tmux session and window cache, see _load_cache. Waits for the
+        read _start_lookups started, if any."""
+        lookup, self._cache_lookup = self._cache_lookup, None
+        cache = lookup.result() if lookup else None
+        return cache if cache is not None else self._load_cache()
+
+    @cached_property
+    def _frecency(self) -> dict:
+        """Frecency stores for sessions ('s') and windows ('w'), persisted in
+        the cache."""
+        from .frecency import Frecency
+
+        data = self._cache.setdefault('frecency', {})
+        return {
+            kind: Frecency(data.setdefault(kind, {}),
+                           half_life=self._config['frecency_half_life'],
+                           max_items=self._config['frecency_max_items'],
+                           activity_weight=self._config['activity_weight'])
+            for kind in ('s', 'w')
+        }
+
+    @cached_property
+    def _sessions(self) -> list:
+        """tmux sessions, see _register_cur_sessions."""
         self._register_cur_sessions()
+        return self.__dict__['_sessions']
+
+    @cached_property
+    def _cur_tmux_s(self):
+        """Current tmux session, see _get_cur_session."""
+        return self._get_cur_session()
+
+    @cached_property
+    def _wm(self):
+        """Instantiate the configured window manager integration, if any."""
         if self._config.get('wm') == 'i3':
-            self._wm = i3WM(self._config, logger_lvl = self.logger.getEffectiveLevel())
-        else:
-            self._wm = None
+            from .i3wm import i3WM
+
+            wm = i3WM(self._config, logger_lvl = self.logger.getEffectiveLevel())
+            if self._watching:
+                wm.watch()
+            return wm
+        return None
+
+    def watch(self) -> None:
+        """Let the window manager integration follow its events, for
+        long-lived instances."""
+        self._watching = True
+        if self._wm:
+            self._wm.watch()
+
+    def _invalidate(self, *attrs) -> None:
+        """Drop lazily resolved attributes so they get resolved again.
+
+        :attrs: attribute names
+
+        """
+        for attr in attrs:
+            self.__dict__.pop(attr, None)
+
+    def refresh(self) -> None:
+        """Bring a long-lived instance up to date before serving a command.
+
+        Config is only re-read when ~/.rft changes, and the window manager
+        connection is kept unless config changed.
+
+        """
+        if '_config' in self.__dict__ and _mtime(self._config_f) != self._config_mtime:
+            self._invalidate('_config', '_wm', '_frecency')
+        elif '_wm' in self.__dict__ and self._wm:
+            self._wm.refresh()
+        self._snapshot = None
+        self._with_panes = False
+        self._cache_lookup = None
+        self._invalidate('_cache', '_frecency', '_sessions', '_cur_tmux_s')
 
     def _load_config(self, conf_file_loc) -> None:
         """Load json config file ~/.rft.
@@ -43,6 +156,25 @@ class RFT(object):
         conf = {
                 'wm': 'i3',
                 'tmux_title_rgx': '{session}',
+                'visibility': 'i3',
+                'lookup_timeout': 0.25,
+                'show_workspace': True,
+                'launcher': 'rofi',
+                'ordering': 'frecency',
+                'frecency_half_life': 259200,
+                'frecency_max_items': 1000,
+                'activity_weight': 0,
+                'preview_workers': 8,
+                'preview_max_bytes': 4096,
+                'preview_timeout': 0.5,
+                'tmux_servers': 'default',
+                'server_timeout': 0.5,
+                'dead_server_ttl': 30,
+                'track_switches': False,
+                'tmuxinator_timeout': 10,
+                'pool_size': 2,
+                'restore_commands': ['vi', 'vim', 'nvim', 'emacs', 'man', 'less',
+                                     'htop', 'top'],
                 'ignored_sessions': []
         }
         conf.update(_read_dict_from_file(conf_file_loc))
@@ -52,91 +184,243 @@ class RFT(object):
 
     def _load_cache(self) -> None:
         """Load last tmux sessions and window cache."""
-
-        cache = {
+        cache = CacheStore(
+            self._cache_f,
+            defaults={
                 'last_tmux_s': None,
                 'last_tmux_w': None
-        }
-        cache.update(_read_dict_from_file(self._cache_f))
+            },
+            logger=self.logger).load()
         self.logger.debug('loaded cache: {}'.format(cache))
         return cache
 
     def _write_cache(self) -> None:
         """Write cache."""
-        try:
-            with open(self._cache_f, 'w') as f:
-                f.write(
-                    json.dumps(
-                        self._cache,
-                        indent=4,
-                        sort_keys=True,
-                        separators=(',', ': '),
-                        ensure_ascii=False))
-            self.logger.debug('wrote cache: {}'.format(self._cache))
-        except IOError as e:
-            raise e
+        self._cache.flush()
+
+    def _tmux(self, *args, server=None):
+        """Run a tmux command, raising if tmux reports an error.
+
+        :args: tmux command and its arguments
+        :server: libtmux.Server to run it on, None for the default one
+
+        """
+        from libtmux.exc import LibTmuxException
+
+        proc = (server or self._libts).cmd(*args)
+        if proc.stderr:
+            raise LibTmuxException(proc.stderr)
+        return proc
+
+    def _refresh_snapshot(self) -> TmuxSnapshot:
+        """Fetch every session and window with a single tmux call, or with
+        none at all when a live tmux model is in sync.
+
+        With tmux_servers set to 'all', every other tmux server is queried
+        concurrently as well and merged in. Panes only come from the default
+        server.
+
+        """
+        if self._config['tmux_servers'] == 'all' and not self._with_panes:
+            from .servers import ServerPool
+
+            pool = ServerPool(timeout=self._config['server_timeout'],
+                              dead_ttl=self._config['dead_server_ttl'],
+                              logger=self.logger)
+            self._snapshot = pool.snapshot(self._fetch_default_snapshot)
+        else:
+            self._snapshot = self._fetch_default_snapshot()
+        return self._snapshot
+
+    def _fetch_default_snapshot(self) -> TmuxSnapshot:
+        """Snapshot the default tmux server, see _refresh_snapshot."""
+        snap = None
+        if self._tmux_model and not self._with_panes:
+            snap = self._tmux_model.snapshot()
+        if snap is None:
+            snap = TmuxSnapshot.fetch(self._libts, with_panes=self._with_panes,
+                                      caller_pane=self.caller_pane)
+            self._sync_hooks(snap.tracking)
+        elif self.caller_pane:
+            proc = self._libts.cmd('display-message', '-p', '-t', self.caller_pane,
+                                   '#{client_name}')
+            if not proc.stderr and proc.stdout:
+                snap.caller = proc.stdout[0] or None
+        return snap
+
+    def _sync_hooks(self, tracking) -> None:
+        """Install the switch tracking hooks (see hooks.py) when track_switches
+        is set and they're missing or outdated, remove them when it isn't.
+
+        :tracking: switch tracking options of a fetched snapshot
+
+        """
+        from .hooks import HOOKS_VERSION, install_commands, uninstall_commands
+
+        if tracking is None:
+            return
+        if self._config['track_switches']:
+            if tracking['hooks'] != HOOKS_VERSION:
+                self.logger.debug('installing switch tracking hooks')
+                self._tmux(*_chain(install_commands()))
+        elif tracking['hooks']:
+            self.logger.debug('removing switch tracking hooks')
+            self._tmux(*_chain(uninstall_commands()))
+
+    def _last_switch(self, key, cache_lookup) -> str:
+        """Return the session ('last_tmux_s') or window ('last_tmux_w') last
+        switched away from: what the switch tracking hooks recorded when
+        enabled, or else what rft itself recorded in the cache.
+
+        :key: 'last_tmux_s' or 'last_tmux_w'
+        :cache_lookup: cache lookup, see _start_lookups
+
+        """
+        tracking = self._snapshot.tracking if self._snapshot else None
+        if self._config['track_switches'] and tracking and tracking[key]:
+            return tracking[key]
+        return cache_lookup.result(self._config['lookup_timeout'], {}).get(key)
 
     def _get_sessions_filtered(self) -> list:
         """Return list of tmux sessions, sans ones explicitly blacklisted
-        by self._config.ignored_sessions"""
-        return [s for s in self._libts.list_sessions() if s.name not in self._config['ignored_sessions']]
+        by self._config.ignored_sessions and pre-spawned ones, see ns"""
+        from .pool import is_pool_session
+
+        sessions = [s for s in self._refresh_snapshot().filtered(self._config['ignored_sessions'])
+                    if not is_pool_session(s)]
+        self._publish_menu(sessions)
+        return sessions
+
+    def _publish_menu(self, sessions) -> None:
+        """Rewrite the menu file rofi-script lists windows from, when its
+        content changed.
+
+        :sessions: sessions to list
+
+        """
+        from .rofi_script import menu_rows, write_menu
+
+        write_menu(menu_rows(self._snapshot, sessions))
 
     def _register_cur_sessions(self) -> None:
         """Register the current tmux sessions _sessions, and
         store current active session in _cur_tmux_s"""
+        from libtmux.exc import LibTmuxException
+
         try:
             self._sessions = self._get_sessions_filtered()
             self.logger.debug('_sessions: {}'.format(self._sessions))
-        except libtmux.exc.LibTmuxException as e:
+        except LibTmuxException as e:
             # if there are no sessions running load_project takes place
+            self._sessions = None
             self.load_tmuxinator()
         self._cur_tmux_s = self._get_cur_session()
         self.logger.debug('_cur_tmux_s: {}'.format(self._cur_tmux_s.name if self._cur_tmux_s else self._cur_tmux_s))
 
-    def _get_cur_session(self) -> libtmux.session.Session:
+    def _headless_sessions(self) -> list:
+        """Resolve _sessions for scripted calls, which must never open a menu:
+        without a tmux server there are no sessions, rather than the
+        tmuxinator menu _register_cur_sessions falls back to."""
+        from libtmux.exc import LibTmuxException
+
+        if '_sessions' not in self.__dict__:
+            try:
+                self._sessions = self._get_sessions_filtered()
+            except LibTmuxException as e:
+                self.logger.debug('no tmux sessions: {}'.format(e))
+                self._sessions = None
+            self._cur_tmux_s = self._get_cur_session()
+        return self._sessions or []
+
+    def _get_cur_session(self):
         """Return reference to our current tmux session."""
-        for s in self._sessions:
-            if str(s.attached_window) != '0':
-                return s
-        return None
+        if not self._sessions:
+            return None
+        return self._snapshot.cur_session(self._sessions)
 
     def _get_cur_tmux_win(self) -> str:
         """Get current tmux window."""
-        if not self._cur_tmux_s:
+        if not self._cur_tmux_s or not self._cur_tmux_s.attached_window:
             return None
         else:
-            return '{}:{}:{}'.format(
-                self._cur_tmux_s.name,
-                self._cur_tmux_s.attached_window.index,
-                self._cur_tmux_s.attached_window.name)
+            return self._cur_tmux_s.attached_window.label
 
     def _get_tmuxinator_projects(self) -> list:
         """Get tmuxinator projects name."""
-        out, err = subprocess.Popen(
-            "tmuxinator list",
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE).communicate()
-        projects = []
-        for line in out.splitlines():
-            line_str = line.decode('utf-8')
-            if "tmuxinator projects" in line_str:
-                continue
-            projects += line_str.split()
+        from .tmuxinator import TmuxinatorProjects
+
+        index = TmuxinatorProjects(self._cache, logger=self.logger)
+        projects = index.list()
+        if index.changed:
+            self._write_cache()
         return projects
 
-    def _get_session_by_name(self, session_name) -> libtmux.session.Session:
-        """Get libtmux.session.Session.
+    def _get_session_by_name(self, session_name):
+        """Get snapshot session record.
 
         :session_name: session name
 
         """
+        from .pool import is_pool_session
+
         if self._sessions:
-            for s in self._sessions:
-                if s.name == session_name:
-                    return s
+            session = self._snapshot.sessions_by_name.get(session_name)
+            if (session and session.name not in self._config['ignored_sessions']
+                    and not is_pool_session(session)):
+                return session
         return None
 
+    def _switch_to(self, session, win=None, pane=None) -> None:
+        """Switch the current client (see TmuxSnapshot.cur_client) to session
+        (and window, and pane), attaching if there are no clients yet.
+
+        A client of another server than session's can't switch to it, so it
+        gets replaced by a client attaching to session's server instead.
+
+        :session: session record to switch to
+        :win: optional window record to select
+        :pane: optional pane record of win to select
+
+        """
+        from libtmux.exc import LibTmuxException
+
+        selects = []
+        if win:
+            selects.append(('select-window', '-t', win.id))
+        if pane:
+            selects.append(('select-pane', '-t', pane.id))
+        client = self._snapshot.cur_client() if self._snapshot else None
+        try:
+            if client and client.session and client.session.server is not session.server:
+                self.logger.debug('tmux re-attaching {}: {}'.format(client.name, session.name))
+                if selects:
+                    self._tmux(*_chain(selects), server=session.server)
+                self._tmux('detach-client', '-t', client.name, '-E', _attach_command(session),
+                           server=client.session.server)
+                return
+            attach = _chain(selects + [('attach-session', '-t', session.id)])
+            if client:
+                # the client rft runs for, rather than the one tmux deems best.
+                switch = [('switch-client', '-c', client.name, '-t', session.id)]
+            elif self._snapshot is None or not self._snapshot.clients_known:
+                switch = [('switch-client', '-t', session.id)]
+            else:
+                # no clients: tmux would pick a control mode one, eg the
+                # daemon's own. Attach if running in the shell.
+                self.logger.debug('tmux attaching: {}'.format(session.name))
+                self._tmux(*attach, server=session.server)
+                return
+            try:
+                self.logger.debug('tmux switching: {}'.format(session.name))
+                self._tmux(*_chain(switch + selects), server=session.server)
+            except LibTmuxException:
+                # there are no attached clients yet
+                # attach if running in the shell
+                self.logger.debug('tmux attaching: {}'.format(session.name))
+                self._tmux(*attach, server=session.server)
+        except LibTmuxException as e:
+            self.logger.error('could not switch to {}: {}'.format(session.name, e))
+
     def _rofi_tmuxinator(self, rofi_msg, rofi_err) -> None:
         """Launch rofi for loading a tmuxinator project.
 
@@ -148,23 +432,22 @@ class RFT(object):
         if projects:
             res, key = self._rofi.select(rofi_msg, projects)
             if key == 0:
-                out, err = subprocess.Popen(
-                    "tmuxinator {}".format(projects[res]),
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE).communicate()
-                # update sessions.
+                from . import tmuxinator
+
+                error = tmuxinator.start(projects[res],
+                                         timeout=self._config['tmuxinator_timeout'],
+                                         logger=self.logger)
+                if error:
+                    self._rofi.error(error)
+                    return
+                # update sessions, the project's windows may still be coming.
                 self._sessions = self._get_sessions_filtered()
                 session = self._get_session_by_name(projects[res])
                 if not session:
                     return
                 if self._wm:
                     self._wm.focus_tmux_window(self._cur_tmux_s)
-                try:
-                    session.attach_session()
-                except libtmux.exc.LibTmuxException as e:
-                    # there are no attached clients just switch instead.
-                    session.switch_client()
+                self._switch_to(session)
                 if self._cur_tmux_s:
                     self._cache['last_tmux_s'] = self._cur_tmux_s.name
                     self._write_cache()
@@ -177,6 +460,196 @@ class RFT(object):
             rofi_msg='Tmuxinator project',
             rofi_err='There are no projects available')
 
+    def new_session(self, name=None, directory=None) -> None:
+        """Create a session and switch to it, claiming one of the sessions
+        spawned ahead of time when there's any, and spawn more for next time.
+
+        :name: session name, asked on rofi when it's None
+        :directory: optional directory its shell starts in
+
+        """
+        from .pool import SessionPool, session_name
+        from libtmux.exc import LibTmuxException
+
+        cache, wm = self._start_lookups('switch')
+        if name is None:
+            name = self._rofi.text_entry('New session')
+        if not name:
+            return
+        name = session_name(name)
+        try:
+            self._sessions = self._get_sessions_filtered()
+        except LibTmuxException:
+            # no server yet
+            self._snapshot = None
+            self._sessions = []
+        self._cur_tmux_s = self._get_cur_session()
+        pool = SessionPool(self._libts, self._config['pool_size'], self._snapshot,
+                           logger=self.logger)
+        session = self._get_session_by_name(name) or pool.claim(name, directory)
+        if session is None:
+            start = ['-c', os.path.expanduser(directory)] if directory else []
+            self._tmux('new-session', '-d', '-s', name, *start)
+            self._sessions = self._get_sessions_filtered()
+            session = self._get_session_by_name(name)
+        if session:
+            self._switch_to_session(wm, session)
+        pool.fill()
+
+    def save(self) -> None:
+        """Save every tmux session, window and pane, but ignored and
+        pre-spawned sessions, see Workspace.save."""
+        from .workspace import Workspace
+
+        Workspace(self._workspace_d, logger=self.logger).save(
+            self._libts, self._config['ignored_sessions'])
+
+    def restore(self) -> None:
+        """Recreate the saved sessions that don't exist, with a single tmux
+        command file, see Workspace.restore_script."""
+        from .workspace import Workspace
+        from libtmux.exc import LibTmuxException
+        import tempfile
+
+        try:
+            existing = set(self._tmux('list-sessions', '-F', '#{session_name}').stdout)
+        except LibTmuxException:
+            # no server yet
+            existing = set()
+        workspace = Workspace(self._workspace_d, logger=self.logger)
+        script, names = workspace.restore_script(existing,
+                                                 self._config['restore_commands'])
+        if not names:
+            print('nothing to restore')
+            return
+        with tempfile.NamedTemporaryFile('w', prefix='rft-restore.', suffix='.tmux') as f:
+            f.write(script)
+            f.flush()
+            try:
+                self._tmux('start-server', ';', 'source-file', f.name)
+            except LibTmuxException as e:
+                # commands that failed don't stop the others.
+                print('tmux: {}'.format(' '.join(e.args[0]) if e.args else e))
+        for name in names:
+            print('restored {}'.format(name))
+
+    def _rank(self, entries, kind) -> list:
+        """Sort menu entries by frecency, unless config asks for tmux order.
+
+        :entries: session or window records
+        :kind: 's' for sessions, 'w' for windows
+
+        """
+        if self._config['ordering'] != 'frecency':
+            return list(entries)
+        key = attrgetter('name') if kind == 's' else attrgetter('label')
+        return self._frecency[kind].rank(entries, key,
+                                         activity=attrgetter('activity'))
+
+    def _record_switch(self, session, win=None) -> None:
+        """Record a switch in the frecency stores.
+
+        :session: session record switched to
+        :win: window record switched to, if any
+
+        """
+        self._frecency['s'].hit(session.name)
+        if win:
+            self._frecency['w'].hit(win.label)
+
+    def _start_lookups(self, action) -> tuple:
+        """Start the lookups the menu doesn't strictly depend on: the cache
+        read and, for switching, connecting to the window manager and
+        prefetching its state.
+
+        Returns the cache and window manager lookups, the latter is None when
+        the action doesn't involve the window manager.
+
+        :action: 'switch', 'kill', 'list'
+
+        """
+        def prefetch_wm():
+            wm = self._wm
+            if wm:
+                wm.prefetch()
+            return wm
+
+        if '_cache' in self.__dict__:
+            cache = background(getattr, self, '_cache')
+        else:
+            # only the main thread resolves _cache, out of this lookup.
+            cache = self._cache_lookup = background(self._load_cache)
+        wm = background(prefetch_wm) if action == 'switch' else None
+        return cache, wm
+
+    def _resolve_visibility(self, wm_lookup, session) -> bool:
+        """Verify if the window housing session is visible, giving up after
+        lookup_timeout seconds so a slow window manager or X server only
+        degrades the preselected row.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+        :session: tmux session whose visibility to check
+
+        """
+        if wm_lookup is None or not session:
+            return False
+
+        def check():
+            wm = wm_lookup.result()
+            return bool(wm) and wm.is_tmux_win_visible(session)
+
+        self.logger.debug('resolving is_tmux_win_visible...')
+        is_tmux_win_visible = background(check).result(
+            timeout=self._config['lookup_timeout'], default=False)
+        self.logger.debug('is_tmux_win_visible: {}'.format(is_tmux_win_visible))
+        return is_tmux_win_visible
+
+    def _annotate(self, wm_lookup) -> dict:
+        """Locate the windows housing every session along with their
+        visibility, see WindowManager.annotate, giving up after
+        lookup_timeout seconds.
+
+        Returns None when that's disabled, not possible or too slow.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+
+        """
+        if wm_lookup is None or not self._config['show_workspace']:
+            return None
+        sessions = self._sessions
+
+        def annotate():
+            wm = wm_lookup.result()
+            return wm.annotate(sessions) if wm else None
+
+        return background(annotate).result(
+            timeout=self._config['lookup_timeout'], default=None)
+
+    def _cur_visibility(self, wm_lookup, notes) -> bool:
+        """Verify if the window housing the current session is visible, out of
+        notes when there are some.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+        :notes: result of _annotate
+
+        """
+        cur = self._cur_tmux_s
+        if notes is None:
+            return self._resolve_visibility(wm_lookup, cur)
+        return bool(cur) and cur.name in notes and notes[cur.name][1]
+
+    def _focus_tmux_window(self, wm_lookup, session) -> None:
+        """Focus the window housing session, unless the window manager never
+        became available.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+        :session: tmux session whose window to focus
+
+        """
+        wm = wm_lookup.result(timeout=self._config['lookup_timeout']) if wm_lookup else None
+        if wm:
+            wm.focus_tmux_window(session)
+
     def _rofi_tmux_session(self, action, rofi_msg) -> None:
         """Launch rofi for a specific tmux session action.
 
@@ -184,49 +657,185 @@ class RFT(object):
         :rofi_msg: rofi displayed message
 
         """
+        # killing doesn't involve the window manager, don't connect to it.
+        cache, wm = self._start_lookups(action)
         if self._sessions:
-            sessions_list = [s.name for s in self._sessions]
-            is_tmux_win_visible = False
-            if self._wm:
-                self.logger.debug('resolving is_tmux_win_visible...')
-                is_tmux_win_visible = self._wm.is_tmux_win_visible(self._cur_tmux_s)
-                self.logger.debug('is_tmux_win_visible: {}'.format(is_tmux_win_visible))
+            sessions = self._rank(self._sessions, 's')
+            sessions_list = [s.name for s in sessions]
+            notes = self._annotate(wm)
+            is_tmux_win_visible = self._cur_visibility(wm, notes)
             try:
                 if is_tmux_win_visible:
-                    sel = sessions_list.index(self._cache.get('last_tmux_s'))
+                    last_tmux_s = self._last_switch('last_tmux_s', cache)
+                    sel = sessions_list.index(last_tmux_s)
                 elif self._cur_tmux_s:
                     sel = sessions_list.index(self._cur_tmux_s.name)
                 else:
                     sel = 0
             except ValueError as e:
                 sel = 0
+            if notes:
+                sessions_list = [_with_note(s.name, notes.get(s.name)) for s in sessions]
+            if action == 'kill':
+                picked = self._select_many(rofi_msg, sessions_list, sessions_list[sel])
+                self._kill('kill-session', [sessions[i] for i in picked])
+                return
             res, key = self._rofi.select(rofi_msg, sessions_list, select=sel)
             if key == 0:
-                session = self._sessions[res]
+                session = sessions[res]
                 if action == 'switch':
-                    if self._wm:
-                        self._wm.focus_tmux_window(self._cur_tmux_s)
-                    try:
-                        session.switch_client()
-                    except libtmux.exc.LibTmuxException as e:
-                        session.attach_session()
-                    if self._cur_tmux_s:
-                        self._cache['last_tmux_s'] = self._cur_tmux_s.name
-                        self._write_cache()
-                elif action == 'kill':
-                    session.kill_session()
+                    self._switch_to_session(wm, session)
                 else:
                     self._rofi.error('This action is not implemented')
         else:
             self._rofi.error("There are no sessions yet")
 
-    def switch_session(self) -> None:
-        """Switch tmux session."""
-        self._rofi_tmux_session(action='switch', rofi_msg='Switch session')
+    def _switch_to_session(self, wm_lookup, session) -> None:
+        """Switch to session, focusing the window housing tmux first, and
+        remember where we came from.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+        :session: session record to switch to
+
+        """
+        self._focus_tmux_window(wm_lookup, self._cur_tmux_s)
+        self._switch_to(session)
+        self._record_switch(session)
+        if self._cur_tmux_s:
+            self._cache['last_tmux_s'] = self._cur_tmux_s.name
+        self._write_cache()
+
+    def switch_session(self, query=None, list_only=False) -> bool:
+        """Switch tmux session, picked on rofi or fuzzy matching query.
+
+        Returns False when query matches no session.
+
+        :query: if it's not None, switch to the session matching it best
+                instead of asking
+        :list_only: if True, print the sessions matching query (all when
+                    it's None), best first, instead of switching
+
+        """
+        if query is None and not list_only:
+            self._rofi_tmux_session(action='switch', rofi_msg='Switch session')
+            return True
+        cache, wm = self._start_lookups('list' if list_only else 'switch')
+        sessions = self._rank(self._headless_sessions(), 's')
+        matches = self._fuzzy_match('s', sessions, [s.name for s in sessions], query)
+        if list_only:
+            for s in matches:
+                print(s.name)
+        elif matches:
+            self._switch_to_session(wm, matches[0])
+        return bool(matches) or query is None
+
+    def _fuzzy_match(self, kind, entries, labels, query) -> list:
+        """Return the entries whose label fuzzy matches query, best first,
+        ties keeping the order of entries. The index is kept as long as labels
+        don't change, for long-lived instances.
 
-    def kill_session(self) -> None:
-        """Kill tmux session."""
-        self._rofi_tmux_session(action='kill', rofi_msg='Kill session')
+        :kind: 's' for sessions, 'w' for windows
+        :entries: records to match
+        :labels: label of every entry
+        :query: text to match, None matches everything
+
+        """
+        from .fuzzy import FuzzyIndex
+
+        if query is None:
+            return entries
+        index = self._fuzzy.get(kind)
+        if index is None or index.entries != labels:
+            index = self._fuzzy[kind] = FuzzyIndex(labels)
+        return [entries[i] for i in index.search(query)]
+
+    def kill_session(self, pattern=None) -> None:
+        """Kill tmux sessions picked on rofi, or matching pattern.
+
+        :pattern: if it's not None, kill every session whose name matches
+                  this shell-style pattern instead of asking
+
+        """
+        if pattern is None:
+            self._rofi_tmux_session(action='kill', rofi_msg='Kill session')
+            return
+        self._kill_matching('kill-session', self._headless_sessions(),
+                            attrgetter('name'), pattern)
+
+    def _select_many(self, rofi_msg, entries, select) -> list:
+        """Show a multi-select menu and return the indexes picked.
+
+        :rofi_msg: rofi displayed message
+        :entries: list of entry strings
+        :select: entry string to preselect
+
+        """
+        from .launcher import StreamingRofi
+
+        indexes, key = StreamingRofi().select_many(rofi_msg, entries, select=select)
+        return indexes if key == 0 else []
+
+    def _kill_matching(self, command, targets, label, pattern) -> None:
+        """Kill the targets whose label matches pattern.
+
+        :command: 'kill-session' or 'kill-window'
+        :targets: session or window records
+        :label: callable returning the label of a target
+        :pattern: shell-style pattern
+
+        """
+        from fnmatch import fnmatchcase
+
+        matching = [t for t in targets if fnmatchcase(label(t), pattern)]
+        if not matching:
+            print('nothing matches {}'.format(pattern))
+        self._kill(command, matching)
+
+    def _kill(self, command, targets) -> None:
+        """Kill sessions or windows with a single chain of tmux commands and
+        report what was killed.
+
+        Targets are addressed by id, which survives the renumbering of window
+        indexes, and windows are killed highest index first all the same.
+
+        :command: 'kill-session' or 'kill-window'
+        :targets: session or window records
+
+        """
+        from libtmux.exc import LibTmuxException
+
+        if not targets:
+            return
+        if command == 'kill-window':
+            targets = sorted(targets, key=lambda w: int(w.index), reverse=True)
+            servers = [t.session.server for t in targets]
+            label = attrgetter('label')
+        else:
+            servers = [t.server for t in targets]
+            label = attrgetter('name')
+        # one chain per tmux server, in practice just the default one.
+        chains = {}
+        for t, server in zip(targets, servers):
+            chains.setdefault(id(server), (server, []))[1].append(t)
+        for server, chain in chains.values():
+            while chain:
+                try:
+                    self._tmux(*_chain((command, '-t', t.id) for t in chain), server=server)
+                except LibTmuxException as e:
+                    # tmux stops at the first target it can't find, which
+                    # went away while the menu was open: carry on after it.
+                    failed = _failed_target(chain, e)
+                    if failed is None:
+                        self.logger.error('could not {}: {}'.format(command, e))
+                        return
+                    for t in chain[:failed]:
+                        print('killed {}'.format(label(t)))
+                    print('already gone {}'.format(label(chain[failed])))
+                    chain = chain[failed + 1:]
+                    continue
+                for t in chain:
+                    print('killed {}'.format(label(t)))
+                chain = []
 
     def _rofi_tmux_window(self, action, session_name, global_scope,
                           rofi_msg) -> None:
@@ -238,92 +847,354 @@ class RFT(object):
         :rofi_msg: rofi displayed message
 
         """
-        windows = None
-        if session_name:
-            session = self._get_session_by_name(session_name = session_name)
-            windows = session.list_windows()
-        else:
-            session = self._cur_tmux_s
-            if session:
-                if global_scope:
-                    windows = []
-                    for s in self._sessions:
-                        windows += s.list_windows()
-                else:
-                    windows = session.list_windows()
-
-        if windows:
-            windows_str = [
-                "{}:{}:{}".format(w.session.name, w.index, w.name)
-                for w in windows
-            ]
-            is_tmux_win_visible = False
+        cache, wm = self._start_lookups(action)
+        scope = self._window_scope(session_name, global_scope)
+        if scope:
             cur_win = self._get_cur_tmux_win()
-            if self._wm:
-                self.logger.debug('resolving is_tmux_win_visible...')
-                is_tmux_win_visible = self._wm.is_tmux_win_visible(self._cur_tmux_s)
-                self.logger.debug('is_tmux_win_visible: {}'.format(is_tmux_win_visible))
-            try:
-                if is_tmux_win_visible:
-                    sel = windows_str.index(self._cache.get('last_tmux_w'))
-                else:
-                    sel = windows_str.index(cur_win)
-            except ValueError as e:
-                sel = 0
+            notes = self._annotate(wm)
+            is_tmux_win_visible = self._cur_visibility(wm, notes)
+            if is_tmux_win_visible:
+                presel = self._last_switch('last_tmux_w', cache)
+            else:
+                presel = cur_win
 
-            res, key = self._rofi.select(rofi_msg, windows_str, select=sel)
-            if key == 0:
-                win = windows[res]
+            if action == 'kill':
+                windows = self._rank((w for s in scope for w in s.windows), 'w')
+                picked = self._select_many(rofi_msg, [w.label for w in windows], presel)
+                self._kill('kill-window', [windows[i] for i in picked])
+                return
+            if self._config['launcher'] == 'stream':
+                res, key, win = self._stream_select_window(rofi_msg, scope, presel,
+                                                           notes or {})
+            else:
+                windows = self._rank((w for s in scope for w in s.windows), 'w')
+                windows_str = [w.label for w in windows]
+                try:
+                    sel = windows_str.index(presel)
+                except ValueError as e:
+                    sel = 0
+                if notes:
+                    windows_str = [_with_note(w.label, notes.get(w.session.name))
+                                   for w in windows]
+                res, key = self._rofi.select(rofi_msg, windows_str, select=sel)
+                win = windows[res] if key == 0 else None
+
+            if key == 0 and win:
                 if action == 'switch':
-                    self.logger.debug('selected: {}'.format(windows_str[res]))
-
-                    if self._wm:
-                        self._wm.focus_tmux_window(self._cur_tmux_s)
-                    try:
-                        self.logger.debug('tmux switching: {}'.format(win.session.name))
-                        win.session.switch_client()
-                        win.select_window()
-                    except libtmux.exc.LibTmuxException as e:
-                        # there are no attached clients yet
-                        # attach if running in the shell
-                        self.logger.debug('tmux attaching: {}'.format(win.session.name))
-                        win.session.attach_session()
-                    self._cache['last_tmux_w'] = cur_win
-                    # also update last session accordingly:
-                    if self._cur_tmux_s:
-                        self._cache['last_tmux_s'] = self._cur_tmux_s.name
-                        self._write_cache()
-                elif action == 'kill':
-                    win.kill_window()
+                    self._switch_to_window(wm, win)
                 else:
                     self._rofi.error('This action is not implemented')
 
-    def switch_window(self, session_name=None, global_scope=True) -> None:
-        """Switch to a window of a particular session or any session.
+    def switch_pane(self) -> None:
+        """Switch to any pane, listed with its command, directory and the last
+        line of its content."""
+        from .preview import PanePreviews
+
+        self._with_panes = True
+        cache, wm = self._start_lookups('switch')
+        if not self._sessions:
+            self._rofi.error("There are no sessions yet")
+            return
+        windows = self._rank((w for s in self._sessions for w in s.windows), 'w')
+        panes = [p for w in windows for p in w.panes]
+        cache.result()
+        previews = PanePreviews(self._libts, self._cache,
+                                workers=self._config['preview_workers'],
+                                max_bytes=self._config['preview_max_bytes'],
+                                timeout=self._config['preview_timeout'],
+                                logger=self.logger)
+        lines = previews.lines(panes)
+        home = os.path.expanduser('~')
+        entries = [_pane_entry(p, lines[p.id], home) for p in panes]
+        cur_win = self._cur_tmux_s.attached_window if self._cur_tmux_s else None
+        sel = next((i for i, p in enumerate(panes)
+                    if p.window is cur_win and p.active), 0)
+        res, key = self._rofi.select('Switch pane', entries, select=sel)
+        if key == 0:
+            self._switch_to_window(wm, panes[res].window, panes[res])
+        elif previews.changed:
+            self._write_cache()
+
+    def grep(self, query=None) -> None:
+        """Switch to a pane whose content holds query, looked up in the
+        scrollback index.
+
+        :query: text to look for, asked on rofi if None
+
+        """
+        self._with_panes = True
+        cache, wm = self._start_lookups('switch')
+        if not self._sessions:
+            self._rofi.error("There are no sessions yet")
+            return
+        panes = [p for s in self._sessions for w in s.windows for p in w.panes]
+        # catch up with the panes while the query is typed.
+        index = background(self._refresh_index, panes)
+        if query is None:
+            query = self._rofi.text_entry('Grep')
+        index = index.result()
+        if index is None:
+            self._rofi.error("Couldn't update the scrollback index")
+            return
+        try:
+            hits = index.search(query) if query else []
+        finally:
+            index.close()
+        if not query:
+            return
+        by_id = self._snapshot.panes_by_id
+        hits = [(by_id[pane_id], n) for pane_id, n in hits if pane_id in by_id]
+        if not hits:
+            self._rofi.error('No pane holds [{}]'.format(query))
+            return
+        home = os.path.expanduser('~')
+        entries = [_pane_entry(p, '({} hits)'.format(n), home) for p, n in hits]
+        res, key = self._rofi.select('Grep {}'.format(query), entries)
+        if key == 0:
+            pane = hits[res][0]
+            self._switch_to_window(wm, pane.window, pane)
+
+    def _refresh_index(self, panes):
+        """Open the scrollback index and bring it up to date with panes.
+
+        :panes: pane records
+
+        """
+        from .scrollback import ScrollbackIndex
+
+        index = ScrollbackIndex(self._index_f, self._libts,
+                                workers=self._config['preview_workers'],
+                                logger=self.logger)
+        index.refresh(panes)
+        return index
+
+    def _switch_to_window(self, wm_lookup, win, pane=None) -> None:
+        """Switch to win (and pane), focusing the window housing tmux first,
+        and remember it along with where we came from.
+
+        :wm_lookup: window manager lookup, see _start_lookups
+        :win: window record to switch to
+        :pane: optional pane record of win to select
+
+        """
+        self.logger.debug('selected: {}'.format(win.label))
+        cur_win = self._get_cur_tmux_win()
+        self._focus_tmux_window(wm_lookup, self._cur_tmux_s)
+        self._switch_to(win.session, win, pane)
+        self._record_switch(win.session, win)
+        self._cache['last_tmux_w'] = cur_win
+        # also update last session accordingly:
+        if self._cur_tmux_s:
+            self._cache['last_tmux_s'] = self._cur_tmux_s.name
+        self._write_cache()
+
+    def switch_window_by_key(self, window_key) -> None:
+        """Switch to a window listed by rofi-script.
+
+        :window_key: window id, prefixed like its session's name when it's
+                     on another tmux server
+
+        """
+        cache, wm = self._start_lookups('switch')
+        if not self._sessions:
+            return
+        win = self._snapshot.windows_by_id.get(window_key)
+        if win is None or win.session not in self._sessions:
+            self.logger.debug('no window {}'.format(window_key))
+            return
+        self._switch_to_window(wm, win)
+
+    def _window_scope(self, session_name, global_scope) -> list:
+        """Return the sessions whose windows to consider, None if there are
+        none.
 
         :session_name: if it's not None, the scope is limited to this session
         :global_scope: if True, it will take into account all existent windows
 
         """
-        self._rofi_tmux_window(
-            action='switch',
-            rofi_msg='Switch window',
-            session_name=session_name,
-            global_scope=global_scope)
+        if session_name:
+            session = self._get_session_by_name(session_name = session_name)
+            return [session] if session else None
+        session = self._cur_tmux_s
+        if session:
+            return self._sessions if global_scope else [session]
+        return None
+
+    def _stream_select_window(self, rofi_msg, scope, presel, notes) -> tuple:
+        """Stream windows of the sessions in scope straight into rofi, current
+        session first, and map the selected index back to its window by
+        walking the same order again rather than keeping a parallel list.
+
+        Returns (index, key, window record or None).
+
+        :rofi_msg: rofi displayed message
+        :scope: sessions whose windows to list
+        :presel: label of the window to preselect
+        :notes: result of _annotate, to annotate entries with
+
+        """
+        from .launcher import StreamingRofi
+        from itertools import islice
+
+        cur = self._cur_tmux_s
+        scope = self._rank(scope, 's')
+        ordered = ([cur] + [s for s in scope if s is not cur]) if cur in scope else scope
+        ranked = {}
+
+        def windows():
+            for s in ordered:
+                if s not in ranked:
+                    ranked[s] = self._rank(s.windows, 'w')
+                yield from ranked[s]
+
+        def label(w):
+            return _with_note(w.label, notes.get(w.session.name)) if notes else w.label
+
+        if notes and cur is not None:
+            presel = next((label(w) for w in cur.windows if w.label == presel), presel)
+        res, key = StreamingRofi().select(rofi_msg, (label(w) for w in windows()),
+                                          select=presel)
+        win = next(islice(windows(), res, None), None) if res >= 0 else None
+        return res, key, win
+
+    def switch_window(self, session_name=None, global_scope=True, query=None,
+                      list_only=False) -> bool:
+        """Switch to a window of a particular session or any session, picked
+        on rofi or fuzzy matching query against 'session:index:name'.
 
-    def kill_window(self, session_name=None, global_scope=True) -> None:
-        """Kill window of a particular session or any session.
+        Returns False when query matches no window.
 
         :session_name: if it's not None, the scope is limited to this session
         :global_scope: if True, it will take into account all existent windows
+        :query: if it's not None, switch to the window matching it best
+                instead of asking
+        :list_only: if True, print the windows matching query (all when it's
+                    None), best first, instead of switching
 
         """
+        if query is None and not list_only:
+            self._rofi_tmux_window(
+                action='switch',
+                rofi_msg='Switch window',
+                session_name=session_name,
+                global_scope=global_scope)
+            return True
+        cache, wm = self._start_lookups('list' if list_only else 'switch')
+        # like kill_window, all windows are in scope even with no client.
+        scope = self._headless_sessions()
+        if session_name or not global_scope:
+            scope = self._window_scope(session_name, global_scope) or []
+        windows = self._rank((w for s in scope for w in s.windows), 'w')
+        matches = self._fuzzy_match('w', windows, [w.label for w in windows], query)
+        if list_only:
+            for w in matches:
+                print(w.label)
+        elif matches:
+            self._switch_to_window(wm, matches[0])
+        return bool(matches) or query is None
+
+    def kill_window(self, session_name=None, global_scope=True,
+                    pattern=None) -> None:
+        """Kill windows of a particular session or any session.
+
+        :session_name: if it's not None, the scope is limited to this session
+        :global_scope: if True, it will take into account all existent windows
+        :pattern: if it's not None, kill every window whose
+                  'session:index:name' label matches this shell-style
+                  pattern instead of asking
+
+        """
+        if pattern is not None:
+            scope = self._headless_sessions()
+            if session_name or not global_scope:
+                scope = self._window_scope(session_name, global_scope) or []
+            self._kill_matching('kill-window', [w for s in scope for w in s.windows],
+                                attrgetter('label'), pattern)
+            return
         self._rofi_tmux_window(
             action='kill',
             rofi_msg='Kill window',
             session_name=session_name,
             global_scope=global_scope)
 
+def _attach_command(session) -> str:
+    """Return the shell command attaching a terminal to session.
+
+    :session: session record
+
+    """
+    tmux = ['tmux']
+    if session.server is not None:
+        tmux += ['-S', str(session.server.socket_path)]
+    return ' '.join(shlex.quote(a) for a in tmux + ['attach-session', '-t', session.id])
+
+
+def _failed_target(targets, error) -> int:
+    """Return the index of the target a tmux "can't find" error is about,
+    None if it's about none of them.
+
+    :targets: session or window records, addressed by id
+    :error: LibTmuxException
+
+    """
+    import re
+
+    for i, t in enumerate(targets):
+        if re.search(r"can't find \w+: {}\b".format(re.escape(t.id)), str(error)):
+            return i
+    return None
+
+
+def _chain(commands) -> list:
+    """Join tmux commands into a single command line, tmux runs them in
+    order in one go.
+
+    :commands: sequences of command name and arguments
+
+    """
+    args = []
+    for cmd in commands:
+        if args:
+            args.append(';')
+        args.extend(cmd)
+    return args
+
+
+def _with_note(label, note) -> str:
+    """Append where a session's window is to a menu entry.
+
+    :label: menu entry
+    :note: (window, visible) as returned by WindowManager.annotate, or None
+
+    """
+    if note is None:
+        return label
+    ref, visible = note
+    where = ref.workspace if not ref.output else '{}@{}'.format(ref.workspace, ref.output)
+    return '{}  [{}{}]'.format(label, where, ', visible' if visible else '')
+
+
+def _pane_entry(pane, line, home) -> str:
+    """Format a pane as a rofi entry.
+
+    :pane: pane record
+    :line: last line of its content
+    :home: home directory, shown as ~
+
+    """
+    path = pane.path
+    if path == home or path.startswith(home + os.sep):
+        path = '~' + path[len(home):]
+    return '{}  {}  {}  {}'.format(pane.label, pane.command, path, line)
+
+
+def _mtime(file_loc):
+    try:
+        return os.stat(file_loc).st_mtime
+    except OSError:
+        return None
+
+
 def _read_dict_from_file(file_loc):
     try:
         with open(file_loc, 'r') as f:
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from .runtime import runtime_file
+
+MENU_VERSION = 'rft-menu 1'
+SEP = '\x1f'
+# rofi's ROFI_RETV values.
+RETV_SELECTED = 1
+RETV_KILL = 10  # kb-custom-1, Alt+1 by default
+
+
+def menu_file() -> str:
+    """Return the path of the menu file."""
+    return runtime_file('rft-menu')
+
+
+def menu_rows(snapshot, sessions) -> list:
+    """Return the rows of the menu file: window key, socket path of its
+    server ('' for the default one) and label, the current session's windows
+    first.
+
+    :snapshot: TmuxSnapshot
+    :sessions: sessions to list
+
+    """
+    cur = snapshot.cur_session(sessions)
+    ordered = ([cur] + [s for s in sessions if s is not cur]) if cur else sessions
+    return [(s.prefix + w.id, str(s.server.socket_path) if s.server else '', w.label)
+            for s in ordered for w in s.windows]
+
+
+def write_menu(rows) -> None:
+    """Replace the menu file atomically, unless it already holds rows.
+
+    :rows: see menu_rows
+
+    """
+    path = menu_file()
+    data = '\n'.join([MENU_VERSION] + [SEP.join(row) for row in rows]) + '\n'
+    try:
+        with open(path) as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.rft-menu.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def read_menu() -> list:
+    """Return the rows of the menu file, None if there's none usable."""
+    try:
+        with open(menu_file()) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    if not lines or lines[0] != MENU_VERSION:
+        return None
+    return [tuple(line.split(SEP)) for line in lines[1:] if line.count(SEP) == 2]
+
+
+def refresh() -> None:
+    """List tmux windows through RFT, which rewrites the menu file."""
+    import rft.rft as rft
+    from libtmux.exc import LibTmuxException
+
+    try:
+        rft.RFT()._get_sessions_filtered()
+    except LibTmuxException:
+        write_menu([])
+
+
+def _refresh_in_background() -> None:
+    """Refresh the menu file for the next listing from a detached process,
+    so this one stays cheap."""
+    subprocess.Popen([sys.executable, '-c', 'from rft.rofi_script import refresh; refresh()'],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def _kill(key, socket) -> None:
+    """Kill a window and drop it from the menu file.
+
+    :key: window key, see menu_rows
+    :socket: socket path of its server, '' for the default one
+
+    """
+    tmux = ['tmux', '-S', socket] if socket else ['tmux']
+    w_id = key.rpartition('/')[2]
+    subprocess.run(tmux + ['kill-window', '-t', w_id], stdin=subprocess.DEVNULL,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = read_menu()
+    if rows is not None:
+        write_menu([row for row in rows if row[:2] != (key, socket)])
+
+
+def _render(out, rows) -> None:
+    """Print the menu in rofi script mode format.
+
+    :out: file to print to
+    :rows: see menu_rows
+
+    """
+    out.write('\0prompt\x1fWindow\n')
+    out.write('\0message\x1fAlt+1: kill window\n')
+    out.write('\0use-hot-keys\x1ftrue\n')
+    out.write('\0no-custom\x1ftrue\n')
+    for key, socket, label in rows:
+        out.write('{}\0info\x1f{}\t{}\n'.format(label, key, socket))
+
+
+def main(argv=None) -> None:
+    """Answer a rofi script mode call (`rofi -modi 'rft:rft rofi-script'`):
+    list windows, or act on the selected one (switch to it, or kill it and
+    list what's left).
+
+    rofi runs the script once per interaction, so listing only reads the menu
+    file rft processes rewrite whenever they list tmux windows, without
+    importing libtmux or talking to i3, and leaves refreshing it for the next
+    time to a detached process. Only switching goes through RFT.
+
+    :argv: arguments rofi passed, the selected entry if any
+
+    """
+    retv = int(os.environ.get('ROFI_RETV') or 0)
+    key, _, socket = os.environ.get('ROFI_INFO', '').partition('\t')
+    if retv == RETV_SELECTED and key:
+        import rft.rft as rft
+
+        rft.RFT().switch_window_by_key(key)
+        return
+    if retv == RETV_KILL and key:
+        _kill(key, socket)
+    rows = read_menu()
+    if rows is None:
+        refresh()
+        rows = read_menu() or []
+    elif retv == 0:
+        _refresh_in_background()
+    _render(sys.stdout, rows)
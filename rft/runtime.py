@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fcntl
+import os
+import time
+
+# seconds between attempts at taking a busy InstanceLock.
+LOCK_POLL = 0.02
+
+
+def runtime_file(name) -> str:
+    """Return the per-user path for a runtime file (socket, lock, ...).
+
+    Uses $XDG_RUNTIME_DIR when available, otherwise falls back to /tmp with
+    the user id in the file name.
+
+    :name: file name, eg 'rft.sock'
+
+    """
+    rundir = os.environ.get('XDG_RUNTIME_DIR')
+    if rundir and os.path.isdir(rundir):
+        return os.path.join(rundir, name)
+    base, ext = os.path.splitext(name)
+    return os.path.join('/tmp', '{}-{}{}'.format(base, os.getuid(), ext))
+
+
+class InstanceLock(object):
+    """Per-user lock on a runtime file, held by the rft instance running a
+    command, along with a tag telling which command it runs.
+
+    Another instance for the same tag gives up right away, so repeated key
+    presses collapse into the running one; another command waits its turn.
+
+    """
+
+    def __init__(self, name='rft.lock') -> None:
+        """Constructor
+
+        :name: runtime file name, see runtime_file
+
+        """
+        self._path = runtime_file(name)
+        self._fd = None
+
+    def acquire(self, tag, timeout) -> bool:
+        """Take the lock and record tag, unless an instance running the same
+        tag holds it. Returns whether the lock was taken, raises TimeoutError
+        when another tag held it for too long.
+
+        :tag: what this instance runs
+        :timeout: seconds to wait for an instance running something else
+
+        """
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if os.pread(fd, 4096, 0).decode('utf-8', 'replace') == tag:
+                    os.close(fd)
+                    return False
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError('another rft command is still running')
+                time.sleep(LOCK_POLL)
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, tag.encode('utf-8'), 0)
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        """Release the lock, if taken."""
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.ftruncate(fd, 0)
+            os.close(fd)
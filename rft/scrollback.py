@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .concurrency import bounded_map
+from collections import Counter
+import logging
+import re
+import sqlite3
+import time
+
+SCHEMA_VERSION = 1
+_TOKEN = re.compile(r'\w+')
+# tokens outside these lengths are mostly noise (or base64), not worth a row.
+MIN_TOKEN = 2
+MAX_TOKEN = 64
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS panes (
+    pane_id TEXT PRIMARY KEY,
+    pid INTEGER,
+    history INTEGER,
+    stamp TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT,
+    pane_id TEXT,
+    screen INTEGER,
+    count INTEGER,
+    seen REAL,
+    PRIMARY KEY (token, pane_id, screen)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_pane ON postings (pane_id);
+'''
+
+
+def tokenize(text) -> list:
+    """Split text into lowercase word tokens, the way it's indexed.
+
+    :text: text to split
+
+    """
+    return [t for t in _TOKEN.findall(text.lower())
+            if MIN_TOKEN <= len(t) <= MAX_TOKEN]
+
+
+class ScrollbackIndex(object):
+    """On-disk inverted index of tmux pane contents: token -> panes, along
+    with how often and when the token was last seen in each.
+
+    Each refresh only captures the history lines a pane appended since it was
+    last indexed, going by its history_size, plus its visible screen, whose
+    tokens are replaced rather than accumulated. Once a pane's history is
+    full, history_size no longer tells how many lines were appended, so its
+    whole history is indexed again when it changes. Panes that are gone are
+    dropped.
+
+    """
+
+    def __init__(self, path, server, workers=8, logger=None) -> None:
+        """Constructor
+
+        :path: sqlite database file
+        :server: libtmux.Server to capture panes from
+        :workers: maximum number of concurrent captures
+        :logger: logger to report to
+
+        """
+        self._server = server
+        self._workers = workers
+        self.logger = logger or logging.getLogger(__name__)
+        # refreshed on a lookup thread, then searched from the main one.
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._db.executescript('DROP TABLE IF EXISTS panes;'
+                                   'DROP TABLE IF EXISTS postings;')
+        self._db.executescript(SCHEMA)
+        self._db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+    def close(self) -> None:
+        self._db.close()
+
+    def refresh(self, panes) -> None:
+        """Bring the index up to date with panes.
+
+        :panes: pane records of every pane to keep indexed
+
+        """
+        known = {row[0]: row[1:] for row in
+                 self._db.execute('SELECT pane_id, pid, history, stamp FROM panes')}
+        live = {p.id for p in panes}
+        dead = [pane_id for pane_id in known if pane_id not in live]
+        todo = {}
+        for p in panes:
+            row = known.get(p.id)
+            if row and row[0] == p.pid and row[2] == p.stamp:
+                continue
+            if (not row or row[0] != p.pid or p.history < row[1]
+                    or p.history >= p.history_limit > 0):
+                # new, reused id, cleared history or full history.
+                todo[p] = (p.history, True)
+            else:
+                todo[p] = (p.history - row[1], False)
+        captured = bounded_map(lambda p: self._capture(p, todo[p][0]), list(todo),
+                               self._workers)
+        now = time.time()
+        with self._db:
+            for pane_id in dead:
+                self._drop(pane_id)
+            for p, (history, screen) in captured.items():
+                if todo[p][1]:
+                    self._drop(p.id)
+                self._db.execute('DELETE FROM postings WHERE pane_id = ? AND screen = 1',
+                                 (p.id,))
+                self._add(p.id, 0, Counter(history), now)
+                self._add(p.id, 1, Counter(screen), now)
+                self._db.execute('INSERT OR REPLACE INTO panes VALUES (?, ?, ?, ?)',
+                                 (p.id, p.pid, p.history, p.stamp))
+        self.logger.debug('scrollback index: {} panes up to date, {} indexed, {} dropped'.format(
+            len(panes) - len(todo), len(captured), len(dead)))
+
+    def _drop(self, pane_id) -> None:
+        self._db.execute('DELETE FROM postings WHERE pane_id = ?', (pane_id,))
+        self._db.execute('DELETE FROM panes WHERE pane_id = ?', (pane_id,))
+
+    def _add(self, pane_id, screen, counts, now) -> None:
+        self._db.executemany(
+            'INSERT INTO postings VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (token, pane_id, screen) DO UPDATE '
+            'SET count = count + excluded.count, seen = excluded.seen',
+            ((token, pane_id, screen, n, now) for token, n in counts.items()))
+
+    def _capture(self, pane, lines) -> tuple:
+        """Capture the last lines of pane's history along with its screen,
+        returning their tokens.
+
+        :pane: pane record
+        :lines: number of history lines to capture
+
+        """
+        proc = self._server.cmd('capture-pane', '-p', '-t', pane.id,
+                                '-S', str(-lines), '-E', '-')
+        # without -J every row is a line of its own, so the history comes
+        # first, line for line.
+        history = [t for line in proc.stdout[:lines] for t in tokenize(line)]
+        screen = [t for line in proc.stdout[lines:] for t in tokenize(line)]
+        return history, screen
+
+    def search(self, query, limit=100) -> list:
+        """Return (pane id, hits) of the panes holding every token of query,
+        most recently seen first. The last token also matches as a prefix.
+
+        :query: text to look for
+        :limit: maximum number of panes returned
+
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        parts = []
+        params = []
+        for i, token in enumerate(tokens):
+            if i == len(tokens) - 1:
+                parts.append('SELECT ? AS q, pane_id, count, seen FROM postings '
+                             'WHERE token >= ? AND token < ?')
+                params += [i, token, token + '\U0010ffff']
+            else:
+                parts.append('SELECT ? AS q, pane_id, count, seen FROM postings '
+                             'WHERE token = ?')
+                params += [i, token]
+        sql = ('SELECT pane_id, SUM(count) FROM ({}) GROUP BY pane_id '
+               'HAVING COUNT(DISTINCT q) = ? ORDER BY MAX(seen) DESC, SUM(count) DESC '
+               'LIMIT ?').format(' UNION ALL '.join(parts))
+        return self._db.execute(sql, params + [len(tokens), limit]).fetchall()
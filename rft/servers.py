@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .concurrency import bounded_map
+from .runtime import runtime_file
+from .snapshot import TmuxSnapshot
+import json
+import logging
+import os
+import stat
+import time
+
+
+def socket_dir() -> str:
+    """Return the directory tmux keeps our server sockets in."""
+    base = os.environ.get('TMUX_TMPDIR') or '/tmp'
+    return os.path.join(base, 'tmux-{}'.format(os.getuid()))
+
+
+def default_socket() -> str:
+    """Return the socket of the server plain `tmux` talks to."""
+    tmux = os.environ.get('TMUX')
+    if tmux:
+        return tmux.split(',')[0]
+    return os.path.join(socket_dir(), 'default')
+
+
+class ServerPool(object):
+    """Every tmux server of ours, found through the sockets in socket_dir().
+
+    Servers are queried concurrently, each within a timeout, so a hung server
+    only loses its own sessions. Sockets that failed or timed out are
+    remembered as dead for a while, so they aren't probed on every menu.
+
+    """
+
+    def __init__(self, timeout=0.5, dead_ttl=30, workers=8, logger=None) -> None:
+        """Constructor
+
+        :timeout: seconds to wait for all servers
+        :dead_ttl: seconds a dead socket isn't probed again
+        :workers: maximum number of servers queried at once
+        :logger: logger to report to
+
+        """
+        self._timeout = timeout
+        self._dead_ttl = dead_ttl
+        self._workers = workers
+        self.logger = logger or logging.getLogger(__name__)
+        self._dead_f = runtime_file('rft-dead-sockets.json')
+
+    def snapshot(self, fetch_default) -> TmuxSnapshot:
+        """Return a snapshot merging every live server, sessions of servers
+        other than the default one being prefixed with '<socket name>/'.
+
+        Raises LibTmuxException when no server answered.
+
+        :fetch_default: callable returning the default server's snapshot
+
+        """
+        import libtmux
+        from libtmux.exc import LibTmuxException
+
+        now = time.time()
+        dead = self._load_dead(now)
+        default = os.path.realpath(default_socket())
+        paths = [p for p in self._discover()
+                 if p not in dead and os.path.realpath(p) != default]
+        servers = {p: libtmux.Server(socket_path=p) for p in paths}
+
+        def fetch(path):
+            if path is None:
+                return fetch_default()
+            return TmuxSnapshot.fetch(servers[path])
+
+        res = bounded_map(fetch, [None] + paths, self._workers, self._timeout)
+        failed = [p for p in paths if p not in res]
+        if failed:
+            self.logger.debug('unresponsive tmux servers: {}'.format(failed))
+            dead.update((p, now) for p in failed)
+            self._save_dead(dead)
+        if not res:
+            raise LibTmuxException('no tmux server answered')
+        parts = [('', None, res[None])] if None in res else []
+        parts += [(os.path.basename(p) + '/', servers[p], res[p])
+                  for p in paths if p in res]
+        return TmuxSnapshot.merge(parts)
+
+    def _discover(self) -> list:
+        """Return the paths of the sockets in socket_dir(), sorted."""
+        try:
+            entries = list(os.scandir(socket_dir()))
+        except OSError:
+            return []
+        paths = []
+        for e in entries:
+            try:
+                if stat.S_ISSOCK(e.stat().st_mode):
+                    paths.append(e.path)
+            except OSError:
+                continue
+        return sorted(paths)
+
+    def _load_dead(self, now) -> dict:
+        """Return the sockets found dead less than dead_ttl seconds ago.
+
+        :now: current unix time
+
+        """
+        try:
+            with open(self._dead_f) as f:
+                dead = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {p: t for p, t in dead.items()
+                if now - t < self._dead_ttl and os.path.exists(p)}
+
+    def _save_dead(self, dead) -> None:
+        """Persist the dead sockets, replacing the file atomically.
+
+        :dead: dict mapping socket paths to when they were found dead
+
+        """
+        tmp = '{}.{}'.format(self._dead_f, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(dead, f)
+            os.replace(tmp, self._dead_f)
+        except OSError as e:
+            self.logger.debug('could not save dead sockets: {}'.format(e))
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+# field separator used in tmux format strings, unlikely to show up in names.
+SEP = '\x1f'
+
+WINDOW_FIELDS = (
+    'session_id',
+    'session_name',
+    'session_attached',
+    'window_id',
+    'window_index',
+    'window_name',
+    'window_active',
+    'session_activity',
+    'window_activity',
+)
+
+PANE_FIELDS = (
+    'window_id',
+    'pane_id',
+    'pane_index',
+    'pane_active',
+    'pane_current_command',
+    'pane_current_path',
+    'history_size',
+    'history_limit',
+    'pane_pid',
+)
+
+CLIENT_FIELDS = (
+    'client_name',
+    'client_control_mode',
+    'client_activity',
+    'client_tty',
+    'session_id',
+)
+
+# client showing the pane rft was run from, see TmuxSnapshot.fetch
+CALLER_FIELDS = (
+    'pane_id',
+    'client_name',
+)
+
+# global options kept up to date by the switch tracking hooks, see hooks.py
+TRACKING_FIELDS = (
+    '@rft_hooks',
+    '@rft_last_s',
+    '@rft_last_w',
+)
+
+
+def _format(fields) -> str:
+    """Build a tmux format string out of a sequence of format variables."""
+    return SEP.join('#{%s}' % f for f in fields)
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def _tty() -> str:
+    """Return the terminal rft runs on, if any."""
+    try:
+        return os.ttyname(0)
+    except OSError:
+        return None
+
+
+class SessionRec(object):
+    """Compact record of a tmux session."""
+
+    __slots__ = ('id', 'name', 'attached', 'activity', 'windows', 'attached_window',
+                 'server', 'prefix')
+
+    def __init__(self, id, name, attached, activity=0) -> None:
+        self.id = id
+        self.name = name
+        self.attached = attached
+        self.activity = activity
+        self.windows = []
+        self.attached_window = None
+        # libtmux.Server the session lives on, None for the default one, and
+        # the prefix its name got in menus
+        self.server = None
+        self.prefix = ''
+
+    @property
+    def tmux_name(self) -> str:
+        """Return the session name as tmux knows it, sans server prefix."""
+        return self.name[len(self.prefix):]
+
+    def __repr__(self) -> str:
+        return 'SessionRec({}, {})'.format(self.id, self.name)
+
+
+class WindowRec(object):
+    """Compact record of a tmux window."""
+
+    __slots__ = ('id', 'index', 'name', 'active', 'activity', 'session', 'panes',
+                 'label')
+
+    def __init__(self, id, index, name, active, session, activity=0) -> None:
+        self.id = id
+        self.index = index
+        self.name = name
+        self.active = active
+        self.activity = activity
+        self.session = session
+        self.panes = []
+        self.label = session.name + ':' + index + ':' + name
+
+    def relabel(self) -> None:
+        """Compute the 'session:index:name' label shown on rofi, again
+        whenever the session got renamed."""
+        self.label = self.session.name + ':' + self.index + ':' + self.name
+
+    def __repr__(self) -> str:
+        return 'WindowRec({}, {})'.format(self.id, self.label)
+
+
+class PaneRec(object):
+    """Compact record of a tmux pane."""
+
+    __slots__ = ('id', 'index', 'active', 'command', 'path', 'window', 'history',
+                 'history_limit', 'pid')
+
+    def __init__(self, id, index, active, command, path, window, history=0,
+                 history_limit=0, pid=0) -> None:
+        self.id = id
+        self.index = index
+        self.active = active
+        self.command = command
+        self.path = path
+        self.window = window
+        self.history = history
+        self.history_limit = history_limit
+        self.pid = pid
+
+    @property
+    def label(self) -> str:
+        """Return the 'session:window index.pane index' tmux target."""
+        return '{}:{}.{}'.format(self.window.session.name, self.window.index,
+                                 self.index)
+
+    @property
+    def stamp(self) -> str:
+        """Return what changes whenever the content of the pane may have: its
+        history size and its window's activity."""
+        return '{}:{}'.format(self.history, self.window.activity)
+
+    def __repr__(self) -> str:
+        return 'PaneRec({}, {}.{})'.format(self.id, self.window.label,
+                                           self.index)
+
+
+class ClientRec(object):
+    """Compact record of a tmux client."""
+
+    __slots__ = ('name', 'activity', 'tty', 'session')
+
+    def __init__(self, name, activity, tty, session) -> None:
+        self.name = name
+        self.activity = activity
+        self.tty = tty
+        self.session = session
+
+    def __repr__(self) -> str:
+        return 'ClientRec({}, {})'.format(self.name, self.session)
+
+
+class TmuxSnapshot(object):
+    """Point-in-time view of every tmux session, window and (optionally) pane
+    fetched with a constant number of tmux invocations."""
+
+    def __init__(self) -> None:
+        """Constructor
+
+        """
+        self.sessions = []
+        self.windows = []
+        self.panes = []
+        self.sessions_by_name = {}
+        self.sessions_by_id = {}
+        self.windows_by_id = {}
+        self.panes_by_id = {}
+        # clients other than control mode ones, and switch tracking options
+        # (see hooks.py), only known to snapshots fetched from tmux
+        self.clients = []
+        self.clients_known = False
+        self.tracking = None
+        # name of the client showing the pane rft was run from, if any
+        self.caller = None
+
+    @classmethod
+    def fetch(cls, server, with_panes=False, caller_pane=None) -> 'TmuxSnapshot':
+        """Query tmux once (twice if panes are requested) and build the model.
+
+        Windows, clients, switch tracking options and the client showing
+        caller_pane come out of a single command line, their rows being told
+        apart by their number of fields.
+
+        :server: libtmux.Server to query
+        :with_panes: if True, also fetch every pane
+        :caller_pane: id of the pane rft was run from ($TMUX_PANE), if any
+
+        """
+        from libtmux.exc import LibTmuxException
+
+        args = ['list-windows', '-a', '-F', _format(WINDOW_FIELDS), ';',
+                'list-clients', '-F', _format(CLIENT_FIELDS), ';',
+                'display-message', '-p', _format(TRACKING_FIELDS)]
+        if caller_pane:
+            args += [';', 'display-message', '-p', '-t', caller_pane, _format(CALLER_FIELDS)]
+        proc = server.cmd(*args)
+        if proc.stderr and caller_pane:
+            # the pane may be gone, or on another server.
+            return cls.fetch(server, with_panes)
+        if proc.stderr:
+            raise LibTmuxException(proc.stderr)
+        snap = cls()
+        snap._load_windows(proc.stdout)
+        if with_panes:
+            proc = server.cmd('list-panes', '-a', '-F', _format(PANE_FIELDS))
+            if proc.stderr:
+                raise LibTmuxException(proc.stderr)
+            snap._load_panes(proc.stdout)
+        return snap
+
+    @classmethod
+    def merge(cls, parts) -> 'TmuxSnapshot':
+        """Combine snapshots of several tmux servers into one.
+
+        Session names get prefixed with their server's prefix, and lookups by
+        id are keyed by prefix + id, ids being only unique within a server.
+
+        :parts: (prefix, libtmux.Server or None for the default, snapshot)
+                tuples
+
+        """
+        snap = cls()
+        for prefix, server, part in parts:
+            for s in part.sessions:
+                s.name = prefix + s.name
+                for w in s.windows:
+                    w.relabel()
+                s.prefix = prefix
+                s.server = server
+                snap.sessions.append(s)
+                snap.sessions_by_name[s.name] = s
+                snap.sessions_by_id[prefix + s.id] = s
+            for w in part.windows:
+                snap.windows.append(w)
+                snap.windows_by_id[prefix + w.id] = w
+            for p in part.panes:
+                snap.panes.append(p)
+                snap.panes_by_id[prefix + p.id] = p
+            snap.clients.extend(part.clients)
+            snap.clients_known = snap.clients_known or part.clients_known
+            if not prefix:
+                snap.tracking = part.tracking
+                snap.caller = part.caller
+        return snap
+
+    def _load_windows(self, lines) -> None:
+        """Parse `list-windows -a` output lines, along with `list-clients`,
+        tracking options and caller ones.
+
+        :lines: lines formatted with WINDOW_FIELDS, CLIENT_FIELDS,
+                TRACKING_FIELDS or CALLER_FIELDS
+
+        """
+        rows = [line.split(SEP) for line in lines]
+        self._load_rows(rows)
+        self.clients_known = True
+        for fields in rows:
+            if len(fields) == len(CLIENT_FIELDS):
+                name, control, activity, tty, s_id = fields
+                if control != '1':
+                    self.clients.append(ClientRec(
+                        name, _int(activity), tty, self.sessions_by_id.get(s_id)))
+            elif len(fields) == len(TRACKING_FIELDS):
+                hooks, last_s, last_w = fields
+                self.tracking = {'hooks': hooks, 'last_tmux_s': last_s,
+                                 'last_tmux_w': last_w}
+            elif len(fields) == len(CALLER_FIELDS):
+                self.caller = fields[1] or None
+
+    def _load_rows(self, rows) -> None:
+        """Build records out of already split window rows.
+
+        :rows: sequences of values ordered as WINDOW_FIELDS
+
+        """
+        for fields in rows:
+            if len(fields) != len(WINDOW_FIELDS):
+                continue
+            (s_id, s_name, s_attached, w_id, w_index, w_name, w_active,
+             s_activity, w_activity) = fields
+            session = self.sessions_by_id.get(s_id)
+            if not session:
+                session = SessionRec(s_id, s_name, s_attached not in ('', '0'),
+                                     _int(s_activity))
+                self.sessions.append(session)
+                self.sessions_by_id[s_id] = session
+                self.sessions_by_name[s_name] = session
+            win = WindowRec(w_id, w_index, w_name, w_active == '1', session,
+                            _int(w_activity))
+            session.windows.append(win)
+            if win.active:
+                session.attached_window = win
+            self.windows.append(win)
+            self.windows_by_id[w_id] = win
+
+    def _load_panes(self, lines) -> None:
+        """Parse `list-panes -a` output lines.
+
+        :lines: lines formatted with PANE_FIELDS
+
+        """
+        for line in lines:
+            fields = line.split(SEP)
+            if len(fields) != len(PANE_FIELDS):
+                continue
+            (w_id, p_id, p_index, p_active, p_cmd, p_path, p_history,
+             p_history_limit, p_pid) = fields
+            win = self.windows_by_id.get(w_id)
+            if not win:
+                continue
+            pane = PaneRec(p_id, p_index, p_active == '1', p_cmd, p_path, win,
+                           _int(p_history), _int(p_history_limit), _int(p_pid))
+            win.panes.append(pane)
+            self.panes.append(pane)
+            self.panes_by_id[p_id] = pane
+
+    def filtered(self, ignored) -> list:
+        """Return sessions whose names are not in ignored.
+
+        :ignored: collection of session names to leave out
+
+        """
+        return [s for s in self.sessions if s.name not in ignored]
+
+    def cur_client(self) -> ClientRec:
+        """Return the client showing the pane rft was run from, or else the
+        one on our terminal, or else the most recently active one, if any.
+
+        Run from a pane, our terminal is the pane's, which no client has.
+
+        """
+        if not self.clients:
+            return None
+        for c in self.clients:
+            if self.caller and c.name == self.caller:
+                return c
+        tty = _tty()
+        for c in self.clients:
+            if tty and c.tty == tty:
+                return c
+        return max(self.clients, key=lambda c: c.activity)
+
+    def cur_session(self, sessions=None) -> SessionRec:
+        """Return the session of the current client, see cur_client. Without
+        client details, the first session with a client attached, if any.
+
+        session_attached counts control mode clients too, so it's only relied
+        on when clients weren't listed, as with the control model, whose
+        sessions only count the other clients.
+
+        :sessions: optional subset of sessions to consider
+
+        """
+        client = self.cur_client()
+        if client is not None and client.session is not None:
+            if sessions is None or client.session in sessions:
+                return client.session
+            return None
+        if self.clients_known:
+            return None
+        for s in (self.sessions if sessions is None else sessions):
+            if s.attached:
+                return s
+        return None
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import subprocess
+import tempfile
+import time
+
+EXTENSIONS = ('.yml', '.yaml')
+# session-created hook index used while a project starts.
+HOOK = 'session-created[91]'
+POLL_INTERVAL = 0.05
+
+
+def config_dirs() -> list:
+    """Return the existing tmuxinator config directories, in the order
+    tmuxinator itself looks them up."""
+    home = os.path.expanduser('~')
+    xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+    dirs = [
+        os.environ.get('TMUXINATOR_CONFIG'),
+        os.path.join(xdg, 'tmuxinator'),
+        os.path.join(home, '.tmuxinator'),
+    ]
+    seen = []
+    for d in dirs:
+        if d and os.path.isdir(d) and os.path.realpath(d) not in map(os.path.realpath, seen):
+            seen.append(d)
+    return seen
+
+
+class TmuxinatorProjects(object):
+    """Index of tmuxinator project names read straight from its config
+    directories, cached until any of those directories changes."""
+
+    CACHE_KEY = 'tmuxinator'
+
+    def __init__(self, cache, logger=None) -> None:
+        """Constructor
+
+        :cache: dict the index is persisted in, usually RFT's cache
+        :logger: logger to report to
+
+        """
+        self._cache = cache
+        self.logger = logger or logging.getLogger(__name__)
+        self.changed = False
+
+    def list(self) -> list:
+        """Return project names, sorted."""
+        dirs = config_dirs()
+        if not dirs:
+            self.logger.debug('no tmuxinator config directory found, asking tmuxinator')
+            return self._list_from_tmuxinator()
+        cached = self._cache.get(self.CACHE_KEY) or {}
+        stamps = cached.get('stamps')
+        if stamps and set(stamps) >= set(dirs) and _stamps_valid(stamps):
+            return cached.get('projects', [])
+        projects, stamps = _scan(dirs)
+        self._cache[self.CACHE_KEY] = {'stamps': stamps, 'projects': projects}
+        self.changed = True
+        self.logger.debug('indexed tmuxinator projects: {}'.format(projects))
+        return projects
+
+    def _list_from_tmuxinator(self) -> list:
+        """Fall back to parsing `tmuxinator list` output."""
+        for args, split in ((['tmuxinator', 'list', '-n'], False),
+                            (['tmuxinator', 'list'], True)):
+            try:
+                proc = subprocess.run(args, stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                return []
+            if proc.returncode != 0:
+                continue
+            projects = []
+            for line in proc.stdout.decode('utf-8').splitlines():
+                if "tmuxinator projects" in line or not line.strip():
+                    continue
+                projects += line.split() if split else [line.strip()]
+            return projects
+        return []
+
+
+def _stamps_valid(stamps) -> bool:
+    """Verify no directory changed since stamps were taken.
+
+    :stamps: dict mapping directory paths to their mtime
+
+    """
+    for path, mtime in stamps.items():
+        try:
+            if os.stat(path).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _scan(dirs) -> tuple:
+    """Walk config directories, returning project names and the mtime of
+    every directory visited.
+
+    :dirs: tmuxinator config directories
+
+    """
+    projects = set()
+    stamps = {}
+    for top in dirs:
+        for root, subdirs, files in os.walk(top, followlinks=True):
+            stamps[root] = os.stat(root).st_mtime
+            rel = os.path.relpath(root, top)
+            for f in files:
+                name, ext = os.path.splitext(f)
+                if ext in EXTENSIONS:
+                    projects.add(name if rel == '.' else os.path.join(rel, name))
+    return sorted(projects), stamps
+
+
+def start(project, timeout=10, logger=None) -> str:
+    """Start a tmuxinator project detached, and return as soon as its session
+    exists while tmuxinator keeps creating windows in the background.
+
+    Session creation is waited for with `tmux wait-for` on a channel that a
+    temporary session-created hook signals; when there's no tmux server to
+    hook into yet, has-session is polled instead.
+
+    Returns None once the session exists, else an error message, including
+    what tmuxinator printed on stderr.
+
+    :project: project name, which is also its session name
+    :timeout: seconds to wait for the session
+    :logger: logger to report to
+
+    """
+    logger = logger or logging.getLogger(__name__)
+    channel = 'rft-tmuxinator-{}'.format(os.getpid())
+    hooked = _tmux('set-hook', '-g', HOOK, 'wait-for -S {}'.format(channel)) == 0
+    deadline = time.monotonic() + timeout
+    # a file rather than a pipe, so tmuxinator never blocks on it once we're gone.
+    err = tempfile.TemporaryFile()
+    try:
+        try:
+            proc = subprocess.Popen(
+                ['tmuxinator', 'start', project, '--no-attach'],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=err,
+                start_new_session=True)
+        except OSError as e:
+            return 'Could not run tmuxinator: {}'.format(e)
+        while True:
+            if _tmux('has-session', '-t', '=' + project) == 0:
+                logger.debug('tmuxinator session {} is up'.format(project))
+                return None
+            if proc.poll() is not None:
+                # failed, or done yet there's no session by that name.
+                break
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return 'tmuxinator timed out starting {}{}'.format(project, _tail(err))
+            if hooked:
+                _tmux('wait-for', channel, timeout=min(left, 1))
+            else:
+                time.sleep(POLL_INTERVAL)
+        return 'tmuxinator failed starting {}{}'.format(project, _tail(err))
+    finally:
+        if hooked:
+            _tmux('set-hook', '-gu', HOOK)
+        err.close()
+
+
+def _tmux(*args, timeout=None) -> int:
+    """Run a tmux command on the default server, returning its exit status,
+    or -1 when it timed out.
+
+    :args: tmux command and arguments
+    :timeout: seconds to wait for it
+
+    """
+    try:
+        return subprocess.run(['tmux'] + list(args), stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              timeout=timeout).returncode
+    except subprocess.TimeoutExpired:
+        return -1
+    except OSError:
+        return 1
+
+
+def _tail(f, size=512) -> str:
+    """Return the last size bytes written to f, as an error message suffix.
+
+    :f: binary file tmuxinator's stderr went to
+
+    """
+    f.seek(0, os.SEEK_END)
+    f.seek(max(f.tell() - size, 0))
+    text = f.read().decode('utf-8', 'replace').strip()
+    return ': {}'.format(text) if text else ''
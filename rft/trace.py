@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    """Records timed spans and writes them as Chrome trace-event JSON, which
+    chrome://tracing, Perfetto or speedscope can open.
+
+    Nothing is instrumented until install() is called: it wraps the functions
+    listed in _targets() and uninstall() puts the originals back, so spans
+    cost nothing when tracing is off.
+
+    """
+
+    def __init__(self, path) -> None:
+        """Constructor
+
+        :path: file to write the trace to
+
+        """
+        self._path = path
+        self._events = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._t0 = time.perf_counter()
+        self._patched = []
+
+    def _record(self, name, start, end, args=None) -> None:
+        event = {
+            'name': name,
+            'cat': 'rft',
+            'ph': 'X',
+            'ts': (start - self._t0) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def wrap(self, fn, name, describe=None):
+        """Return fn recording a span named name around each call.
+
+        :fn: function to wrap
+        :name: span name
+        :describe: optional callable turning the call arguments into span args
+
+        """
+        tracer = self
+
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                tracer._record(name, start, end,
+                               describe(*args, **kwargs) if describe else None)
+
+        return traced
+
+    def install(self) -> None:
+        """Instrument every target."""
+        for owner, attr, name, describe in _targets():
+            orig = owner.__dict__[attr]
+            setattr(owner, attr, self.wrap(orig, name, describe))
+            self._patched.append((owner, attr, orig))
+
+    def uninstall(self) -> None:
+        """Put the original functions back."""
+        while self._patched:
+            owner, attr, orig = self._patched.pop()
+            setattr(owner, attr, orig)
+
+    def write(self) -> None:
+        """Write the recorded spans to the trace file."""
+        with self._lock:
+            events = sorted(self._events, key=lambda e: e['ts'])
+        with open(self._path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def _tmux_args(server, *args, **kwargs) -> dict:
+    return {'args': ' '.join(str(a) for a in args)}
+
+
+def _xprop_args(args, *rest, **kwargs) -> dict:
+    return {'args': ' '.join(args)}
+
+
+def _rofi_args(launcher, prompt, *args, **kwargs) -> dict:
+    return {'prompt': prompt}
+
+
+def _targets() -> list:
+    """Return the (owner, attribute, span name, describe) of every function
+    traced."""
+    import libtmux
+    from . import rft, visibility
+    from .launcher import StreamingRofi
+
+    targets = [
+        (rft.RFT, '_load_config', 'load_config', None),
+        (rft.RFT, '_load_cache', 'load_cache', None),
+        (rft.RFT, '_get_sessions_filtered', 'get_sessions', None),
+        (rft.RFT, '_switch_to', 'switch', None),
+        (rft.RFT, '_write_cache', 'write_cache', None),
+        (libtmux.Server, 'cmd', 'tmux', _tmux_args),
+        (visibility, 'check_output', 'xprop', _xprop_args),
+        (StreamingRofi, 'select', 'rofi', _rofi_args),
+        (StreamingRofi, 'select_many', 'rofi', _rofi_args),
+    ]
+    try:
+        import rofi
+
+        targets.append((rofi.Rofi, 'select', 'rofi', _rofi_args))
+    except ImportError:
+        pass
+    try:
+        from .i3wm import i3WM
+
+        targets.append((i3WM, '_find_tmux_window', 'i3_find_tmux_window', None))
+        targets.append((i3WM, 'annotate', 'i3_annotate', None))
+        targets.append((i3WM, '_get_index', 'i3_index', None))
+    except ImportError:
+        pass
+    try:
+        import i3ipc
+
+        targets.append((i3ipc.Connection, 'get_tree', 'i3_get_tree', None))
+    except ImportError:
+        pass
+    return targets
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from subprocess import check_output
+
+SCRATCHPAD = '__i3_scratch'
+
+
+class VisibilityBackend(ABC):
+    """Decides whether i3 windows are visible on our screen(s)."""
+
+    def __init__(self, wm) -> None:
+        """Constructor
+
+        :wm: i3WM instance the windows belong to
+
+        """
+        self._wm = wm
+        self.logger = wm.logger
+        super(VisibilityBackend, self).__init__()
+
+    @abstractmethod
+    def visible(self, wins) -> dict:
+        """Return a dict mapping the con id of each given window to whether
+        it's visible.
+
+        :wins: iterable of ConRef
+
+        """
+        pass
+
+
+class I3Visibility(VisibilityBackend):
+    """Decide visibility from i3 IPC data alone: the window's workspace is
+    visible on some output, it's not in the scratchpad and it's not behind a
+    tabbed/stacked sibling."""
+
+    def visible(self, wins) -> dict:
+        _, visible_ws = self._wm._get_workspaces()
+        return {
+            w.id: (w.workspace in visible_ws and w.workspace != SCRATCHPAD
+                   and not self._wm.is_behind_sibling(w))
+            for w in wins
+        }
+
+
+class XVisibility(VisibilityBackend):
+    """Read _NET_WM_STATE straight from the X server, over a single
+    connection, falling back to I3Visibility when X isn't reachable."""
+
+    def __init__(self, wm) -> None:
+        super(XVisibility, self).__init__(wm)
+        self._display = None
+        self._fallback = None
+
+    def _connect(self) -> bool:
+        """Open the X connection, returns False if that's not possible."""
+        if self._display is not None:
+            return True
+        try:
+            from Xlib import display
+
+            self._display = display.Display()
+        except Exception as e:
+            self.logger.debug('no X connection ({}), using i3 visibility'.format(e))
+            return False
+        self._state = self._display.intern_atom('_NET_WM_STATE')
+        self._hidden = self._display.intern_atom('_NET_WM_STATE_HIDDEN')
+        return True
+
+    def visible(self, wins) -> dict:
+        if not self._connect():
+            if self._fallback is None:
+                self._fallback = I3Visibility(self._wm)
+            return self._fallback.visible(wins)
+        from Xlib import Xatom, error
+
+        res = {}
+        for w in wins:
+            try:
+                xwin = self._display.create_resource_object('window', w.window)
+                prop = xwin.get_full_property(self._state, Xatom.ATOM)
+            except error.XError:
+                res[w.id] = False
+                continue
+            res[w.id] = not (prop and self._hidden in prop.value)
+        return res
+
+
+class XpropVisibility(VisibilityBackend):
+    """Fork `xprop -id` per window and look for _NET_WM_STATE_HIDDEN."""
+
+    def visible(self, wins) -> dict:
+        res = {}
+        for w in wins:
+            try:
+                xprop = check_output(['xprop', '-id', str(w.window)]).decode()
+                res[w.id] = '_NET_WM_STATE_HIDDEN' not in xprop
+            except FileNotFoundError:
+                # if xprop not found, fall back to just checking if tmux win is on our current worksapce:
+                self.logger.debug('xprop utility is not found - please install it.')
+                self.logger.debug('will decide visibility simply by checking if tmux is on our current workspace')
+                res[w.id] = self._wm._is_tmux_win_on_current_ws(w)
+        return res
+
+
+BACKENDS = {
+    'i3': I3Visibility,
+    'x11': XVisibility,
+    'xprop': XpropVisibility,
+}
+
+
+def make_backend(name, wm) -> VisibilityBackend:
+    """Instantiate the visibility backend called name.
+
+    :name: one of BACKENDS keys, None for the default
+    :wm: i3WM instance the windows belong to
+
+    """
+    backend = BACKENDS.get(name or 'i3')
+    if backend is None:
+        wm.logger.debug('unknown visibility backend [{}], using i3'.format(name))
+        backend = I3Visibility
+    return backend(wm)
@@ -27,3 +27,33 @@ class WindowManager(ABC):
 
         """
         pass
+
+    def annotate(self, sessions) -> dict:
+        """Locate the windows housing the given tmux sessions
+
+        Returns a dict mapping session names to (window, visible), window
+        having at least workspace and output attributes. Window managers that
+        can't tell return an empty dict.
+
+        """
+        return {}
+
+    def refresh(self) -> None:
+        """Refresh any state kept between commands by long-lived processes
+
+        """
+        pass
+
+    def watch(self) -> None:
+        """Keep state up to date from window manager events, for long-lived
+        processes
+
+        """
+        pass
+
+    def prefetch(self) -> None:
+        """Fetch whatever state the next calls will need, so that it can be
+        done concurrently with other lookups
+
+        """
+        pass
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .pool import POOL_PREFIX
+from .snapshot import SEP, _format
+from urllib.parse import quote
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+VERSION = 1
+MANIFEST = 'index.json'
+
+SAVE_FIELDS = (
+    'session_name',
+    'window_index',
+    'window_name',
+    'window_layout',
+    'window_active',
+    'automatic-rename',
+    'pane_index',
+    'pane_active',
+    'pane_current_path',
+    'pane_current_command',
+)
+
+
+def _quote(value, format_expanded=False) -> str:
+    """Quote value for a tmux command file.
+
+    :value: argument
+    :format_expanded: True for arguments tmux expands formats in, whose #
+                      has to be doubled
+
+    """
+    value = value.replace('\\', '\\\\').replace('"', '\\"').replace('$', '\\$')
+    if value.startswith('~'):
+        # expanded to the home directory, even in double quotes.
+        value = '\\' + value
+    if format_expanded:
+        value = value.replace('#', '##')
+    return '"{}"'.format(value)
+
+
+def _target(session, window=None, pane=None) -> str:
+    """Return an exact target for a session, window or pane.
+
+    :session: session name
+    :window: window index
+    :pane: pane index
+
+    """
+    target = '=' + session + ':'
+    if window is not None:
+        target += str(window)
+    if pane is not None:
+        target += '.' + str(pane)
+    return _quote(target)
+
+
+class Workspace(object):
+    """Saved tmux sessions, one versioned JSON file per session in a
+    directory, along with a manifest of their names and content hashes.
+
+    Saving only rewrites the files of sessions that changed since the last
+    save. Restoring replays every missing session through a single tmux
+    command file.
+
+    """
+
+    def __init__(self, path, logger=None) -> None:
+        """Constructor
+
+        :path: directory sessions are saved in
+        :logger: logger to report to
+
+        """
+        self._path = path
+        self.logger = logger or logging.getLogger(__name__)
+
+    def save(self, server, ignored=()) -> tuple:
+        """Save every session of server out of a single list-panes call,
+        except ignored and pre-spawned ones.
+
+        Returns (names of the sessions saved, names of the sessions whose
+        file was rewritten).
+
+        :server: libtmux.Server to save
+        :ignored: collection of session names to leave out
+
+        """
+        from libtmux.exc import LibTmuxException
+
+        proc = server.cmd('list-panes', '-a', '-F', _format(SAVE_FIELDS))
+        if proc.stderr:
+            raise LibTmuxException(proc.stderr)
+        sessions = {name: windows for name, windows in _parse(proc.stdout).items()
+                    if name not in ignored and not name.startswith(POOL_PREFIX)}
+        os.makedirs(self._path, exist_ok=True)
+        old = self._load_manifest()
+        hashes = {}
+        written = []
+        for name, windows in sessions.items():
+            text = json.dumps({'version': VERSION, 'name': name, 'windows': windows},
+                              sort_keys=True)
+            hashes[name] = hashlib.sha1(text.encode('utf-8')).hexdigest()
+            if old.get(name) != hashes[name]:
+                self._write(_file_name(name), text)
+                written.append(name)
+        for name in old:
+            if name not in hashes:
+                try:
+                    os.unlink(os.path.join(self._path, _file_name(name)))
+                except OSError:
+                    pass
+        if written or set(old) != set(hashes):
+            self._write(MANIFEST, json.dumps({'version': VERSION, 'sessions': hashes}))
+        self.logger.debug('saved {} sessions, rewrote {}'.format(len(hashes), written))
+        return list(sessions), written
+
+    def load(self) -> list:
+        """Return the saved sessions, as dicts with name and windows."""
+        sessions = []
+        for name in self._load_manifest():
+            try:
+                with open(os.path.join(self._path, _file_name(name))) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.debug('skipping saved session {}: {}'.format(name, e))
+                continue
+            if data.get('version') == VERSION:
+                sessions.append(data)
+        return sessions
+
+    def restore_script(self, existing, commands) -> tuple:
+        """Return (tmux command file content, names of the sessions it
+        creates), leaving out sessions that already exist.
+
+        :existing: names of the existing sessions
+        :commands: commands to start again in the panes that ran them
+
+        """
+        lines = []
+        names = []
+        for session in self.load():
+            name = session['name']
+            if name in existing or not session['windows']:
+                continue
+            names.append(name)
+            active = None
+            for i, w in enumerate(session['windows']):
+                first = w['panes'][0]
+                # naming a window turns automatic-rename off for it.
+                named = '' if w.get('auto_rename') else ' -n ' + _quote(w['name'], True)
+                if i == 0:
+                    lines.append('new-session -d -s {}{} -c {}'.format(
+                        _quote(name), named, _quote(first['path'], True)))
+                    # the first window gets base-index, move it unless it's there.
+                    lines.append('if -F -t {} "#{{!=:#{{window_index}},{}}}" '
+                                 '{{ move-window -s {} -t {} }}'.format(
+                                     _target(name, '^'), w['index'],
+                                     _target(name, '^'), _target(name, w['index'])))
+                else:
+                    lines.append('new-window -d -t {}{} -c {}'.format(
+                        _target(name, w['index']), named, _quote(first['path'], True)))
+                # splitting the last pane numbers the new one right after it.
+                for prev, p in zip(w['panes'], w['panes'][1:]):
+                    lines.append('split-window -d -t {} -c {}'.format(
+                        _target(name, w['index'], prev['index']), _quote(p['path'], True)))
+                if len(w['panes']) > 1:
+                    lines.append('select-layout -t {} {}'.format(
+                        _target(name, w['index']), _quote(w['layout'])))
+                for p in w['panes']:
+                    target = _target(name, w['index'], p['index'])
+                    if p['command'] in commands:
+                        lines.append('send-keys -t {} {} Enter'.format(
+                            target, _quote(p['command'])))
+                    if p['active'] and len(w['panes']) > 1:
+                        lines.append('select-pane -t {}'.format(target))
+                if w['active']:
+                    active = w['index']
+            if active is not None:
+                lines.append('select-window -t {}'.format(_target(name, active)))
+        return '\n'.join(lines) + '\n', names
+
+    def _load_manifest(self) -> dict:
+        """Return the content hash of every saved session, by name."""
+        try:
+            with open(os.path.join(self._path, MANIFEST)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != VERSION:
+            return {}
+        return data.get('sessions', {})
+
+    def _write(self, name, text) -> None:
+        """Replace a file of the directory atomically.
+
+        :name: file name
+        :text: content
+
+        """
+        fd, tmp = tempfile.mkstemp(dir=self._path, prefix='.' + name)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp, os.path.join(self._path, name))
+        except OSError:
+            os.unlink(tmp)
+            raise
+
+
+def _file_name(session) -> str:
+    return quote(session, safe='') + '.json'
+
+
+def _parse(lines) -> dict:
+    """Group `list-panes -a` output lines by session and window.
+
+    :lines: lines formatted with SAVE_FIELDS
+
+    """
+    sessions = {}
+    windows = {}
+    for line in lines:
+        fields = line.split(SEP)
+        if len(fields) != len(SAVE_FIELDS):
+            continue
+        (s_name, w_index, w_name, w_layout, w_active, w_auto, p_index, p_active,
+         p_path, p_cmd) = fields
+        win = windows.get((s_name, w_index))
+        if win is None:
+            win = windows[(s_name, w_index)] = {
+                'index': int(w_index), 'name': w_name, 'layout': w_layout,
+                'active': w_active == '1', 'auto_rename': w_auto == '1', 'panes': []}
+            sessions.setdefault(s_name, []).append(win)
+        win['panes'].append({'index': int(p_index), 'path': p_path,
+                             'command': p_cmd, 'active': p_active == '1'})
+    return sessions
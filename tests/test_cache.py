@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rft import cache
+from rft.cache import CacheStore
+
+
+class TestCacheStore(unittest.TestCase):
+    """The store against files of its own, in a temporary directory."""
+
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp(prefix='rft-test-')
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, '.rft.cache')
+
+    def store(self) -> CacheStore:
+        return CacheStore(self.path, defaults={'last_tmux_s': ''}).load()
+
+    def test_round_trip(self) -> None:
+        c = self.store()
+        c['last_tmux_s'] = 'alpha'
+        c['ws'] = {'1': {'last_tmux_w': 'alpha:0'}}
+        c.flush()
+        self.assertEqual(self.store(), c)
+
+    def test_concurrent_flushes_merge(self) -> None:
+        a = self.store()
+        b = self.store()
+        a['ws'] = {'1': {'last_tmux_w': 'alpha:0'}}
+        b['ws'] = {'2': {'last_tmux_w': 'beta:1'}}
+        b['last_tmux_s'] = 'beta'
+        a.flush()
+        b.flush()
+        self.assertEqual(self.store(), {
+            'last_tmux_s': 'beta',
+            'ws': {'1': {'last_tmux_w': 'alpha:0'}, '2': {'last_tmux_w': 'beta:1'}},
+        })
+
+    def test_delete(self) -> None:
+        c = self.store()
+        c['ws'] = {'1': {'last_tmux_w': 'alpha:0'}, '2': {'last_tmux_w': 'beta:1'}}
+        c.flush()
+        del c['ws']['1']
+        c.flush()
+        self.assertEqual(self.store()['ws'], {'2': {'last_tmux_w': 'beta:1'}})
+
+    def test_torn_journal_line_skipped(self) -> None:
+        c = self.store()
+        c['last_tmux_s'] = 'alpha'
+        c.flush()
+        with open(self.path + '.journal', 'a') as f:
+            f.write('[["last_tmux_s"],"be')
+        self.assertEqual(self.store()['last_tmux_s'], 'alpha')
+        c['ws'] = {'1': {'last_tmux_w': 'alpha:0'}}
+        c.flush()
+        self.assertEqual(self.store(), {
+            'last_tmux_s': 'alpha',
+            'ws': {'1': {'last_tmux_w': 'alpha:0'}},
+        })
+
+    def test_compaction(self) -> None:
+        c = self.store()
+        c['last_tmux_s'] = 'alpha'
+        c.flush()
+        c['ws'] = {'1': {'last_tmux_w': 'alpha:0'}}
+        with mock.patch.object(cache, 'COMPACT_THRESHOLD', 0), \
+                mock.patch('os.replace', wraps=os.replace) as replace:
+            c.flush()
+        self.assertEqual(len(replace.call_args_list), 1)
+        tmp, dst = replace.call_args[0]
+        self.assertEqual(os.path.dirname(tmp), self.dir)
+        self.assertEqual(dst, self.path)
+        self.assertEqual(os.path.getsize(self.path + '.journal'), 0)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['.rft.cache', '.rft.cache.journal', '.rft.cache.lock'])
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {
+                'version': cache.SCHEMA_VERSION,
+                'data': {'last_tmux_s': 'alpha', 'ws': {'1': {'last_tmux_w': 'alpha:0'}}},
+            })
+        self.assertEqual(self.store(), c)
+
+    def test_reads_version_1(self) -> None:
+        with open(self.path, 'w') as f:
+            json.dump({'last_tmux_s': 'alpha', 'ws': {'1': {'last_tmux_w': 'alpha:0'}}},
+                      f, indent=4)
+        c = self.store()
+        self.assertEqual(c['ws'], {'1': {'last_tmux_w': 'alpha:0'}})
+        c['last_tmux_s'] = 'beta'
+        c.flush()
+        self.assertEqual(self.store(), {
+            'last_tmux_s': 'beta',
+            'ws': {'1': {'last_tmux_w': 'alpha:0'}},
+        })
+
+    def test_corrupt_base_ignored(self) -> None:
+        with open(self.path, 'w') as f:
+            f.write('{"version": 2, "da')
+        self.assertEqual(self.store(), {'last_tmux_s': ''})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import time
+import unittest
+
+from rft.control import TmuxControlModel
+
+
+@unittest.skipUnless(shutil.which('tmux'), 'tmux is not installed')
+class TestTmuxControlModel(unittest.TestCase):
+    """The model against a tmux server of its own, on a private -L socket."""
+
+    def setUp(self) -> None:
+        import libtmux
+
+        self.socket = 'rft-test-{}-{}'.format(os.getpid(), self._testMethodName)
+        self.tmux('-f', '/dev/null', 'new-session', '-d', '-s', 'alpha')
+        self.tmux('set-option', '-g', 'renumber-windows', 'on')
+        self.tmux('new-window', '-d', '-t', 'alpha:', '-n', 'two')
+        self.model = TmuxControlModel(server=libtmux.Server(socket_name=self.socket))
+        self.model.start()
+        self.assertTrue(self.model.wait_synced(5))
+
+    def tearDown(self) -> None:
+        self.model.stop()
+        self.tmux('kill-server')
+
+    def tmux(self, *args) -> str:
+        return subprocess.run(['tmux', '-L', self.socket] + list(args),
+                              capture_output=True, text=True).stdout
+
+    def expected(self) -> list:
+        return self.tmux('list-windows', '-a', '-F',
+                         '#{session_name}:#{window_index}:#{window_name}').splitlines()
+
+    def assertInSync(self) -> None:
+        """Wait for the model to catch up with tmux, a subscription can take
+        a second to be reported."""
+        expected = self.expected()
+        deadline = time.monotonic() + 3
+        while True:
+            snap = self.model.snapshot()
+            labels = [w.label for s in snap.sessions for w in s.windows] if snap else None
+            if labels == expected or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual(labels, expected)
+
+    def test_initial(self) -> None:
+        self.assertInSync()
+
+    def test_add(self) -> None:
+        self.tmux('new-window', '-d', '-t', 'alpha:', '-n', 'three')
+        self.tmux('new-session', '-d', '-s', 'beta')
+        self.assertInSync()
+
+    def test_close_renumbers(self) -> None:
+        self.tmux('new-window', '-d', '-t', 'alpha:', '-n', 'three')
+        self.tmux('kill-window', '-t', 'alpha:0')
+        self.assertInSync()
+
+    def test_rename(self) -> None:
+        self.tmux('rename-window', '-t', 'alpha:1', 'renamed')
+        self.tmux('rename-session', '-t', 'alpha', 'gamma')
+        self.assertInSync()
+
+    def test_swap(self) -> None:
+        self.tmux('swap-window', '-s', 'alpha:0', '-t', 'alpha:1')
+        self.assertInSync()
+
+    def test_move(self) -> None:
+        self.tmux('move-window', '-s', 'alpha:0', '-t', 'alpha:7')
+        self.assertInSync()
+        self.tmux('move-window', '-r', '-t', 'alpha')
+        self.assertInSync()
+
+    @unittest.skipUnless(shutil.which('script'), 'script is not installed')
+    def test_switch_moves_the_real_client(self) -> None:
+        import libtmux
+        from rft.rft import RFT
+
+        self.tmux('new-session', '-d', '-s', 'beta')
+        client = subprocess.Popen(
+            ['script', '-qfc', 'tmux -L {} attach -t alpha'.format(self.socket), '/dev/null'],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(client.wait)
+        self.addCleanup(client.stdin.close)
+        deadline = time.monotonic() + 3
+        while True:
+            snap = self.model.snapshot()
+            tty = snap.cur_client().tty if snap and snap.cur_client() else ''
+            if tty or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual([c.session.name for c in snap.clients], ['alpha'])
+        self.assertEqual(snap.cur_client().tty, tty)
+
+        rft = RFT()
+        rft.__dict__['_libts'] = libtmux.Server(socket_name=self.socket)
+        rft._snapshot = snap
+        rft._switch_to(snap.sessions_by_name['beta'])
+        clients = self.tmux('list-clients', '-F',
+                            '#{client_control_mode} #{session_name}').splitlines()
+        self.assertEqual(sorted(clients), ['0 beta', '1 alpha'])
+
+
+if __name__ == '__main__':
+    unittest.main()
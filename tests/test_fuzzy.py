@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import string
+import unittest
+
+from rft.fuzzy import BOUNDARIES, FuzzyIndex, _bit, _mask, score
+
+
+class TestScore(unittest.TestCase):
+
+    def test_subsequence(self) -> None:
+        self.assertIsNotNone(score('abc', 'xaxbxc'))
+        self.assertIsNone(score('acb', 'xaxbxc'))
+        self.assertIsNone(score('abcd', 'abc'))
+
+    def test_empty_query(self) -> None:
+        self.assertIsNotNone(score('', 'abc'))
+
+    def test_consecutive_beats_scattered(self) -> None:
+        self.assertGreater(score('abc', 'xabcx'), score('abc', 'xaxbxcx'))
+
+    def test_word_start_beats_middle(self) -> None:
+        self.assertGreater(score('vi', 'work:1:vim'), score('vi', 'work:1:nvix'))
+
+    def test_prefix_beats_word_start(self) -> None:
+        self.assertGreater(score('dot', 'dotfiles:0:zsh'), score('dot', 'work:0:dotfiles'))
+
+    def test_shortest_window(self) -> None:
+        # the forward scan alone would start at the first 'a', far away.
+        self.assertEqual(score('ab', 'a----ab'), score('ab', 'ab'.rjust(7, '-')))
+
+
+class TestMask(unittest.TestCase):
+
+    def test_own_bits(self) -> None:
+        chars = string.ascii_lowercase + string.digits + BOUNDARIES
+        self.assertEqual(len({_bit(c) for c in chars}), len(chars))
+        self.assertTrue(all(0 <= _bit(c) < 64 for c in chars))
+
+    def test_non_ascii(self) -> None:
+        self.assertEqual(_mask('é'), 1 << _bit('é'))
+        self.assertLess(_bit('é'), 64)
+
+    def test_subset(self) -> None:
+        self.assertEqual(_mask('pz') & _mask('0:'), 0)
+        self.assertEqual(_mask('vim') & _mask('work:1:vim'), _mask('vim'))
+
+
+class TestFuzzyIndex(unittest.TestCase):
+
+    entries = ['work:0:zsh', 'work:1:vim', 'dotfiles:0:nvim', 'music:0:ncmpcpp', 'Vids:2:feh']
+
+    def labels(self, index, query) -> list:
+        return [index.entries[i] for i in index.search(query)]
+
+    def test_best_first(self) -> None:
+        index = FuzzyIndex(self.entries)
+        self.assertEqual(self.labels(index, 'vim'),
+                         ['work:1:vim', 'dotfiles:0:nvim'])
+
+    def test_case_insensitive(self) -> None:
+        index = FuzzyIndex(self.entries)
+        self.assertEqual(self.labels(index, 'VIDS'), ['Vids:2:feh'])
+
+    def test_ties_keep_order(self) -> None:
+        index = FuzzyIndex(['b:0:x', 'a:0:x', 'c:0:x'])
+        self.assertEqual(self.labels(index, 'x'), ['b:0:x', 'a:0:x', 'c:0:x'])
+
+    def test_no_match(self) -> None:
+        self.assertEqual(FuzzyIndex(self.entries).search('qq'), [])
+
+    def test_typing(self) -> None:
+        """Narrowing, widening and unrelated queries in a row, masks built
+        midway, give the same results as a fresh index."""
+        index = FuzzyIndex(self.entries)
+        for query in ['m', 'mp', 'mpv', 'm', 'w', 'wo0', '', 'n', 'nc', 'zz', 'z']:
+            self.assertEqual(index.search(query), FuzzyIndex(self.entries).search(query),
+                             query)
+        self.assertIsNotNone(index._masks)
+
+
+if __name__ == '__main__':
+    unittest.main()
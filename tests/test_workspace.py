@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from rft.workspace import Workspace, _quote
+
+# names tmux command files would otherwise split, expand or unescape.
+NAMES = ['a b', 'say "hi"', "it's", 'c:\\dir', '$HOME', '#{pane_id}', 'x; y', '~']
+
+
+class TestQuote(unittest.TestCase):
+
+    def test_quote(self) -> None:
+        self.assertEqual(_quote('a b'), '"a b"')
+        self.assertEqual(_quote('say "hi"'), '"say \\"hi\\""')
+        self.assertEqual(_quote('c:\\dir'), '"c:\\\\dir"')
+        self.assertEqual(_quote('$HOME'), '"\\$HOME"')
+        self.assertEqual(_quote('~'), '"\\~"')
+        self.assertEqual(_quote('a~'), '"a~"')
+        self.assertEqual(_quote('#{pane_id}'), '"#{pane_id}"')
+        self.assertEqual(_quote('#{pane_id}', True), '"##{pane_id}"')
+
+
+@unittest.skipUnless(shutil.which('tmux'), 'tmux is not installed')
+class TestRestore(unittest.TestCase):
+    """Save and restore through a tmux server of its own, on a private -L
+    socket."""
+
+    def setUp(self) -> None:
+        import libtmux
+
+        self.socket = 'rft-test-{}-{}'.format(os.getpid(), self._testMethodName)
+        self.addCleanup(self.tmux, 'kill-server')
+        self.dir = tempfile.mkdtemp(prefix='rft-test-')
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.server = libtmux.Server(socket_name=self.socket)
+        self.workspace = Workspace(os.path.join(self.dir, 'sessions'))
+
+    def tmux(self, *args) -> str:
+        return subprocess.run(['tmux', '-L', self.socket] + list(args),
+                              capture_output=True, text=True).stdout
+
+    def tmux_run(self, *args) -> int:
+        return subprocess.run(['tmux', '-L', self.socket] + list(args),
+                              capture_output=True).returncode
+
+    def windows(self) -> list:
+        return self.tmux('list-panes', '-a', '-F',
+                         '#{session_name}|#{window_index}|#{window_name}|'
+                         '#{automatic-rename}|#{pane_current_path}').splitlines()
+
+    def restore(self) -> None:
+        script, names = self.workspace.restore_script(set(), ())
+        path = os.path.join(self.dir, 'restore.tmux')
+        with open(path, 'w') as f:
+            f.write(script)
+        # a server started right after kill-server may exit at once.
+        for _ in range(50):
+            if not self.tmux_run('-f', '/dev/null', 'new-session', '-d', '-s', '_rft_keep'):
+                break
+            time.sleep(0.05)
+        proc = subprocess.run(['tmux', '-L', self.socket, 'source-file', path],
+                              capture_output=True, text=True)
+        self.assertEqual(proc.stderr, '')
+        self.tmux('kill-session', '-t', '=_rft_keep')
+
+    def test_round_trip(self) -> None:
+        for i, name in enumerate(NAMES):
+            path = os.path.join(self.dir, name.replace('/', '_'))
+            os.mkdir(path)
+            # -n and -c expand formats.
+            name, path = name.replace('#', '##'), path.replace('#', '##')
+            if i == 0:
+                self.tmux('-f', '/dev/null', 'new-session', '-d', '-s', NAMES[0],
+                          '-n', name, '-c', path)
+            else:
+                self.tmux('new-window', '-d', '-t', '={}:'.format(NAMES[0]),
+                          '-n', name, '-c', path)
+        self.tmux('new-session', '-d', '-s', NAMES[1], '-c', self.dir)
+        self.tmux('set-option', '-w', '-t', '={}:'.format(NAMES[1]),
+                  'automatic-rename', 'on')
+        expected = self.windows()
+        self.workspace.save(self.server)
+        self.tmux('kill-server')
+
+        self.restore()
+        self.assertEqual(self.windows(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()